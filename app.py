@@ -5,27 +5,53 @@
 
 import streamlit as st
 import os
+import html
+import json
+from pathlib import Path
 from dotenv import load_dotenv
-import pandas as pd
 from grammar_analyzer import (
     GrammarAnalyzer, 
     format_result_for_display, 
     create_colored_text,
-    create_simple_html_visualization
+    split_chunks,
+    iter_chunk_extractions,
+    realign_document,
+    BatchProcessor
 )
 import time
+import asyncio
+import threading
 import traceback
+import semantic_cache
 from examples import (
     get_grammar_examples,
-    get_phrase_examples,
     get_keyword_examples,
-    get_combined_examples,
-    PROMPTS
+    PROMPTS,
+    SAMPLE_SENTENCES,
+    SAMPLE_BUTTON_LABELS
 )
 
 # 加载环境变量
 load_dotenv()
 
+CSS_PATH = Path(__file__).parent / "assets" / "styles.css"
+
+# 流式展示时标注区域的最短刷新间隔（秒）
+RENDER_INTERVAL = 0.1
+
+# 功能 -> (示例函数, 提示词, 展示名称)
+ACTION_TABLE = {
+    "grammar": (get_grammar_examples, PROMPTS["grammar"], "语法成分分析"),
+    "keyword": (get_keyword_examples, PROMPTS["keyword"], "重点单词标记"),
+}
+
+
+@st.cache_data
+def load_css() -> str:
+    """读取样式表（每个进程只读取一次文件）"""
+    return CSS_PATH.read_text(encoding="utf-8")
+
+
 # 页面配置
 st.set_page_config(
     page_title="语法分析 Demo - LangExtract",
@@ -35,119 +61,19 @@ st.set_page_config(
 )
 
 # 自定义样式
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        color: #1f77b4;
-        text-align: center;
-        margin-bottom: 2rem;
-    }
-    .sub-header {
-        font-size: 1.5rem;
-        color: #ff7f0e;
-        margin-top: 2rem;
-        margin-bottom: 1rem;
-    }
-    .info-box {
-        background-color: #e7f3ff;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #1f77b4;
-        margin: 1rem 0;
-    }
-    .warning-box {
-        background-color: #fff3cd;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #ffc107;
-        margin: 1rem 0;
-    }
-    .success-box {
-        background-color: #d4edda;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #28a745;
-        margin: 1rem 0;
-    }
-    
-    /* Custom Tooltip CSS */
-    .tooltip-wrapper {
-        position: relative;
-        display: inline-block;
-        border-bottom: 1px dotted black; /* If you want to underline */
-        cursor: help;
-    }
-
-    .tooltip-text {
-        visibility: hidden;
-        min-width: 200px;
-        max-width: 400px;
-        background-color: #262730 !important;
-        color: #fff !important;
-        text-align: left;
-        border-radius: 8px;
-        padding: 12px;
-        position: absolute;
-        z-index: 999999;
-        top: 130%;
-        left: 50%;
-        transform: translateX(-50%);
-        opacity: 0;
-        transition: opacity 0.2s;
-        font-size: 0.9rem;
-        font-family: sans-serif;
-        line-height: 1.5;
-        box-shadow: 0 4px 12px rgba(0,0,0,0.3);
-        white-space: normal;
-        pointer-events: none;
-    }
-    
-    .tooltip-text::after {
-        content: "";
-        position: absolute;
-        bottom: 100%;
-        left: 50%;
-        margin-left: -5px;
-        border-width: 5px;
-        border-style: solid;
-        border-color: transparent transparent #262730 transparent;
-    }
-
-    .tooltip-wrapper:hover .tooltip-text {
-        visibility: visible;
-        opacity: 1;
-    }
-    
-    /* Custom Button Colors */
-    
-    /* Button 1: Grammar (Blue) */
-    div[data-testid="column"]:nth-of-type(1) button[kind="primary"],
-    div[data-testid="stColumn"]:nth-of-type(1) button[kind="primary"] {
-        background-color: #2196F3 !important;
-        border-color: #2196F3 !important;
-    }
-    div[data-testid="column"]:nth-of-type(1) button[kind="primary"]:hover,
-    div[data-testid="stColumn"]:nth-of-type(1) button[kind="primary"]:hover {
-        background-color: #1976D2 !important;
-        border-color: #1976D2 !important;
-    }
-    
-    /* Button 2: Keyword (Orange) */
-    div[data-testid="column"]:nth-of-type(2) button[kind="primary"],
-    div[data-testid="stColumn"]:nth-of-type(2) button[kind="primary"] {
-        background-color: #FF9800 !important;
-        border-color: #FF9800 !important;
-    }
-    div[data-testid="column"]:nth-of-type(2) button[kind="primary"]:hover,
-    div[data-testid="stColumn"]:nth-of-type(2) button[kind="primary"]:hover {
-        background-color: #F57C00 !important;
-        border-color: #F57C00 !important;
-    }
-
-
-</style>
-""", unsafe_allow_html=True)
+st.markdown(f"<style>{load_css()}</style>", unsafe_allow_html=True)
+
+
+@st.cache_resource
+def get_analyzer(api_key: str, model_id: str) -> GrammarAnalyzer:
+    """
+    每个进程只创建一次分析器，在所有 rerun 和会话之间共享
+
+    应用的持久化缓存只有 semantic_cache（.cache/semantic.sqlite3），
+    分析器不再另外保存响应缓存，避免同一结果在磁盘上存两份
+    """
+    return GrammarAnalyzer(api_key=api_key, model_id=model_id, cache_path=None)
+
 
 # 标题
 st.markdown('<h1 class="main-header">📝 语法分析 Demo</h1>', unsafe_allow_html=True)
@@ -177,73 +103,292 @@ model_id = "gemini-2.5-flash-lite"
 
 # 初始化分析器
 try:
-    analyzer = GrammarAnalyzer(api_key=api_key, model_id=model_id)
+    analyzer = get_analyzer(api_key, model_id)
 except Exception as e:
     st.error(f"初始化失败: {str(e)}")
     st.stop()
 
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def run_analysis(text: str, action: str) -> list:
+    """
+    执行分析并缓存结果（相同文本 + 功能直接命中缓存，不再调用 API）
+
+    只返回可序列化的格式化结果，不缓存原始 AnnotatedDocument
+    """
+    if action not in ACTION_TABLE:
+        raise ValueError(f"未知的分析类型: {action}")
+    examples_fn, prompt, _ = ACTION_TABLE[action]
+    examples = examples_fn()
+    analyzer = get_analyzer(api_key, model_id)
+
+    # 近似重复的输入直接复用语义缓存（按模型、提示词和示例区分，修改任一项后不会命中旧结果）
+    context = analyzer.context_key(prompt, examples)
+    cached = semantic_cache.lookup(text, context)
+    if cached is not None:
+        result = realign_document(cached, text)
+        # 有提取在当前文本中找不到时不复用，重新调用 API
+        if result is not None:
+            return analyzer.format_extractions(result)
+
+    result = analyzer.analyze_grammar(
+        text=text,
+        prompt=prompt,
+        examples=examples
+    )
+    semantic_cache.store(text, context, result)
+    return analyzer.format_extractions(result)
+
+
+async def _prewarm_async():
+    await asyncio.gather(
+        *(
+            asyncio.to_thread(run_analysis, chunk, action)
+            for sentence in SAMPLE_SENTENCES
+            for _, chunk in split_chunks(sentence)
+            for action in ACTION_TABLE
+        ),
+        return_exceptions=True  # 预热失败不影响使用，点击时会重新调用
+    )
+
+
+@st.cache_resource
+def _start_prewarm() -> threading.Thread:
+    """每个进程只启动一次后台预热，把示例句子（按分析时的分块）的结果提前放入 run_analysis 缓存"""
+    thread = threading.Thread(target=asyncio.run, args=(_prewarm_async(),), daemon=True)
+    thread.start()
+    return thread
+
+
+_start_prewarm()
+
+
+def position_key(extraction: dict) -> tuple:
+    """按开始位置排序的键，没有位置信息的提取排在最后"""
+    start = extraction["位置"]["开始"]
+    return (start is None, start or 0)
+
+
+def collect_extractions(text: str, action: str, max_workers: int = 4) -> list:
+    """分块分析（每块走 run_analysis 缓存）并按位置汇总全文的提取结果"""
+    extractions = [
+        e
+        for chunk_extractions in iter_chunk_extractions(
+            text, lambda chunk: run_analysis(chunk, action), max_workers=max_workers
+        )
+        for e in chunk_extractions
+    ]
+    extractions.sort(key=position_key)
+    return extractions
+
+
+async def run_analysis_async(text: str, action: str) -> list:
+    return await asyncio.to_thread(collect_extractions, text, action)
+
+
+async def run_all_analyses_async(text: str) -> list:
+    """并发执行所有分析功能，返回 [(分析名称, 提取结果)] 列表"""
+    results = await asyncio.gather(
+        *(run_analysis_async(text, action) for action in ACTION_TABLE)
+    )
+    return [
+        (analysis_type, extractions)
+        for (_, _, analysis_type), extractions in zip(ACTION_TABLE.values(), results)
+    ]
+
+
+def render_colored_text(placeholder, text: str, extractions: list) -> None:
+    """在占位区域中渲染带颜色标注的原文"""
+    colored_html = create_colored_text(text, extractions)
+    placeholder.markdown(f'<div class="tooltip-container" style="line-height: 2.0; font-size: 1.1em;">{colored_html}</div>', unsafe_allow_html=True)
+
+
+def render_result_header(analysis_type: str) -> None:
+    """渲染结果标题和原文标注小标题"""
+    st.markdown(f'<h3 class="sub-header">📊 {analysis_type}结果</h3>', unsafe_allow_html=True)
+    st.subheader("原文标注")
+
+
+def _attrs_html(attrs: dict) -> str:
+    if not attrs:
+        return '<span class="extr-empty">无详细属性</span>'
+    return " | ".join(
+        f"<strong>{html.escape(str(k))}</strong>: {html.escape(str(v))}"
+        for k, v in attrs.items()
+    )
+
+
+def render_details(extractions: list, key_prefix: str) -> None:
+    """
+    按类型分组渲染详细分析
+
+    每个类型用开关代替展开框：折叠的类型不生成任何元素，
+    rerun 的开销只与已展开的类型数量和条目数有关
+    """
+    st.markdown('<h3 class="sub-header">📋 详细分析</h3>', unsafe_allow_html=True)
+
+    grouped = format_result_for_display(extractions, group_by="类型")
+
+    for extraction_type, items in grouped.items():
+        if not st.toggle(f"**{extraction_type}** ({len(items)} 个)", key=f"details_{key_prefix}_{extraction_type}"):
+            continue
+
+        # 同一类型的所有条目合并为一个表格，一次输出
+        rows = "".join(
+            f"<tr><td><code>{html.escape(item['文本'])}</code></td>"
+            f"<td>{_attrs_html(item.get('属性') or {})}</td></tr>"
+            for item in items
+        )
+        st.markdown(f"<table class='extr'>{rows}</table>", unsafe_allow_html=True)
+
+
+def render_results(text: str, results: list) -> None:
+    """
+    展示分析结果
+
+    Args:
+        text: 原始文本
+        results: [(分析名称, 提取结果)] 列表，多个结果时分标签页展示
+    """
+    if len(results) == 1:
+        containers = [st.container()]
+    else:
+        containers = st.tabs([analysis_type for analysis_type, _ in results])
+
+    for container, (analysis_type, extractions) in zip(containers, results):
+        with container:
+            render_result_header(analysis_type)
+            render_colored_text(st.empty(), text, extractions)
+            render_details(extractions, key_prefix=analysis_type)
+
+
+def parse_batch_file(uploaded_file) -> list:
+    """解析批量文件：txt 每行一条文本，jsonl 每行一个含字符串 text 字段的对象（格式不符时抛出 ValueError）"""
+    lines = [
+        (number, line.strip())
+        for number, line in enumerate(uploaded_file.getvalue().decode("utf-8").splitlines(), 1)
+        if line.strip()
+    ]
+    if not uploaded_file.name.endswith(".jsonl"):
+        return [line for _, line in lines]
+
+    texts = []
+    for number, line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"第 {number} 行不是合法的 JSON: {e}") from e
+        if not isinstance(record, dict) or not isinstance(record.get("text"), str):
+            raise ValueError(f"第 {number} 行不是含字符串 text 字段的 JSON 对象")
+        texts.append(record["text"])
+    return texts
+
+
+def render_batch_mode() -> None:
+    """批量模式：上传文件，以有限并发逐条分析并显示进度"""
+    with st.expander("📦 批量模式", expanded=False):
+        uploaded_file = st.file_uploader("上传文本文件（txt 每行一句，或 jsonl 每行含 text 字段）", type=["txt", "jsonl"])
+        batch_action = st.radio(
+            "分析功能",
+            options=list(ACTION_TABLE),
+            format_func=lambda a: ACTION_TABLE[a][2],
+            horizontal=True
+        )
+        if not (uploaded_file and st.button("批量分析")):
+            return
+
+        try:
+            texts = parse_batch_file(uploaded_file)
+        except (UnicodeDecodeError, ValueError) as e:
+            st.error(f"文件解析失败: {str(e)}")
+            return
+
+        progress = st.progress(0.0, text=f"0 / {len(texts)}")
+        # 并发由 BatchProcessor 控制，每条文本的分块串行分析，避免并发请求数成倍增加
+        processor = BatchProcessor(lambda text: collect_extractions(text, batch_action, max_workers=1))
+        results = processor.process(
+            texts,
+            on_progress=lambda done, total: progress.progress(done / total, text=f"{done} / {total}")
+        )
+
+        rows = [
+            {
+                "序号": i,
+                "文本": text,
+                "提取数": len(result) if not isinstance(result, Exception) else 0,
+                "状态": "成功" if not isinstance(result, Exception) else f"失败: {result}"
+            }
+            for i, (text, result) in enumerate(zip(texts, results), 1)
+        ]
+        st.dataframe(rows, use_container_width=True)
+
+        output = "\n".join(
+            json.dumps({"text": text, "extractions": result}, ensure_ascii=False)
+            for text, result in zip(texts, results)
+            if not isinstance(result, Exception)
+        )
+        st.download_button("下载结果 (JSONL)", output, file_name="batch_results.jsonl")
+
+
 # 输入区域
 st.markdown('<div class="info-box">输入你想分析的英语句子，或从下方选择示例</div>', unsafe_allow_html=True)
 
-user_text = st.text_area(
-    "输入文本",
-    height=150,
-    placeholder="例如: The quick brown fox jumps over the lazy dog.",
-    label_visibility="collapsed",
-    key="user_text"
-)
+# 输入框和功能按钮放在表单中，输入过程中不触发 rerun，提交时才执行一次
+with st.form("analysis_form", clear_on_submit=False):
+    user_text = st.text_area(
+        "输入文本",
+        height=150,
+        placeholder="例如: The quick brown fox jumps over the lazy dog.",
+        label_visibility="collapsed",
+        key="user_text"
+    )
+
+    # 功能入口按钮
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        grammar_submitted = st.form_submit_button("语法成分分析", use_container_width=True, type="primary")
+    with col2:
+        keyword_submitted = st.form_submit_button("重点单词标记", use_container_width=True, type="primary")
+    with col3:
+        both_submitted = st.form_submit_button("全部分析", use_container_width=True, type="primary")
+
+if grammar_submitted:
+    action = "grammar"
+elif keyword_submitted:
+    action = "keyword"
+elif both_submitted:
+    action = "both"
+else:
+    action = None
+
+
+def update_text(text: str) -> None:
+    """示例按钮回调：文本未变化时不重复写入 session_state"""
+    if st.session_state.get("user_text") != text:
+        st.session_state.user_text = text
 
-# 示例句子 (紧凑展示)
-sample_sentences = [
-    "I can share another truth with you. Because of a global supply chain shortage, there are not enough folding chairs. So half of you had to sit on blankets today. Fortunately, our staff, who are amazing, creative, resilient, and made this commencement become a reality.",
-    "Photosynthesis is the biological process by which plants convert light energy into chemical energy, creating oxygen as a byproduct, which supports life on Earth.",
-    "The algorithm demonstrates remarkable efficiency in processing large datasets, utilizing advanced heuristics to minimize computational complexity while maintaining high accuracy.",
-    "Despite the heavy rain and strong winds, the dedicated team continued their rescue mission, determined to save every stranded villager before nightfall.",
-    "Understanding quantum mechanics requires abandoning classical intuition, as particles exist in superposition states until observed, challenging our fundamental perception of reality.",
-    "The quick brown fox jumps over the lazy dog."
-]
 
+# 示例按钮不能放在表单内，通过回调写入 session_state.user_text
 st.markdown('<div style="margin-bottom: 5px; color: #666; font-size: 0.9em;">📚 试一试:</div>', unsafe_allow_html=True)
 sample_cols = st.columns(2)  # 使用两列布局使其更紧凑
 
-for i, sentence in enumerate(sample_sentences, 1):
-    # 使用回调函数更新 session_state
-    def update_text(text=sentence):
-        st.session_state.user_text = text
-    
+for i, (sentence, label) in enumerate(zip(SAMPLE_SENTENCES, SAMPLE_BUTTON_LABELS), 1):
     col_idx = (i - 1) % 2
     with sample_cols[col_idx]:
         st.button(
-            f"{i}. {sentence[:40]}..." if len(sentence) > 40 else f"{i}. {sentence}",
+            label,
             key=f"sample_{i}",
             on_click=update_text,
+            args=(sentence,),
             use_container_width=True,
             help=sentence
         )
 
 st.markdown('<div style="height: 10px;"></div>', unsafe_allow_html=True)
 
-# 功能入口按钮
-col1, col2 = st.columns(2)
-action = None
-
-with col1:
-    if st.button("语法成分分析", use_container_width=True, type="primary"):
-        action = "grammar"
-with col2:
-    if st.button("重点单词标记", use_container_width=True, type="primary"):
-        action = "keyword"
-
 # 执行分析
 if action and user_text:
-    if action == "grammar":
-        examples = get_grammar_examples()
-        prompt = PROMPTS["grammar"]
-        analysis_type = "语法成分分析"
-    elif action == "keyword":
-        examples = get_keyword_examples()
-        prompt = PROMPTS["keyword"]
-        analysis_type = "重点单词标记"
+    analysis_type = "全部分析" if action == "both" else ACTION_TABLE[action][2]
     
     # Debug info
     with st.expander("🛠️ 调试信息 (如果在云端卡住请点此)", expanded=False):
@@ -262,12 +407,26 @@ if action and user_text:
         status_container.write(f"🚀 正在调用 Google Gemini API ({model_id})...")
         start_time = time.time()
         
-        # 执行分析
-        result = analyzer.analyze_grammar(
-            text=user_text,
-            prompt=prompt,
-            examples=examples
-        )
+        if action == "both":
+            # 两种分析并发执行，结果分标签页展示
+            results = asyncio.run(run_all_analyses_async(user_text))
+        else:
+            # 显示结果标题
+            render_result_header(analysis_type)
+            annotated_placeholder = st.empty()
+            
+            # 执行分析（长文本分块并发，每块结果按文本 + 功能缓存），按固定间隔批量刷新标注
+            extractions = []
+            last_flush = 0.0
+            for chunk_extractions in iter_chunk_extractions(user_text, lambda chunk: run_analysis(chunk, action)):
+                extractions.extend(chunk_extractions)
+                if time.monotonic() - last_flush > RENDER_INTERVAL:
+                    render_colored_text(annotated_placeholder, user_text, extractions)
+                    last_flush = time.monotonic()
+            
+            extractions.sort(key=position_key)
+            render_colored_text(annotated_placeholder, user_text, extractions)
+            results = [(analysis_type, extractions)]
         
         duration = time.time() - start_time
         status_container.write(f"✅ API 调用成功! 耗时: {duration:.2f}s")
@@ -276,45 +435,27 @@ if action and user_text:
         status_container.write("✨ 正在格式化结果...")
         status_container.update(label="✅ 分析完成!", state="complete", expanded=False)
         
-        # 格式化结果
-        extractions = analyzer.format_extractions(result)
-            
-        # 显示结果标题
-        st.markdown(f'<h3 class="sub-header">📊 {analysis_type}结果</h3>', unsafe_allow_html=True)
-        
-        # 原文标注展示
-        st.subheader("原文标注")
-        
-        # 创建彩色文本
-        colored_html = create_colored_text(user_text, extractions)
-        st.markdown(f'<div class="tooltip-container" style="line-height: 2.0; font-size: 1.1em;">{colored_html}</div>', unsafe_allow_html=True)
-        
-        # 详细结果 (默认折叠)
-        st.markdown('<h3 class="sub-header">📋 详细分析</h3>', unsafe_allow_html=True)
-        
-        # 按类型分组展示
-        grouped = format_result_for_display(extractions, group_by="类型")
-        
-        for extraction_type, items in grouped.items():
-            with st.expander(f"**{extraction_type}** ({len(items)} 个)", expanded=False):
-                for item in items:
-                    col_a, col_b = st.columns([1, 2])
-                    with col_a:
-                        st.markdown(f"**文本**: `{item['文本']}`")
-                    with col_b:
-                        # Safe attributes handling
-                        attrs = item.get('属性') or {}
-                        if attrs:
-                            attributes_str = " | ".join(
-                                [f"**{k}**: {v}" for k, v in attrs.items()]
-                            )
-                            st.markdown(attributes_str)
-                        else:
-                            st.caption("无详细属性")
-                    st.divider()
+        # 保存结果，展开/折叠详细分析等 rerun 时直接复用
+        st.session_state.analysis_result = {
+            "text": user_text,
+            "results": results
+        }
+        if action == "both":
+            render_results(user_text, results)
+        else:
+            render_details(extractions, key_prefix=analysis_type)
         
     except Exception as e:
+        st.session_state.pop("analysis_result", None)
         status_container.update(label="❌ 分析失败", state="error", expanded=True)
         st.error(f"❌ 错误详情: {str(e)}")
         st.markdown("### 🔍 错误堆栈 (Traceback)")
         st.code(traceback.format_exc())
+
+elif "analysis_result" in st.session_state:
+    # 非提交触发的 rerun（如切换详细分析开关）直接展示上次结果
+    last_result = st.session_state.analysis_result
+    render_results(last_result["text"], last_result["results"])
+
+# 批量模式
+render_batch_mode()
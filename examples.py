@@ -3,322 +3,255 @@
 用于 LangExtract 的 few-shot learning
 """
 
+from functools import lru_cache
+
 import langextract as lx
 
-def get_grammar_examples():
+
+def _build_examples(raw):
     """
-    语法成分分析示例
-    包括：主语、谓语、宾语、定语、状语、补语
-    注意：所有示例都包含精确的位置信息（start_char, end_char）
+    将紧凑的元组定义转换为 LangExtract 示例对象
+
+    每条提取的格式为 (extraction_class, extraction_text, start_pos, end_pos, attributes)
     """
     return [
         lx.data.ExampleData(
-            text="The quick brown fox jumps over the lazy dog.",
+            text=text,
             extractions=[
                 lx.data.Extraction(
-                    extraction_class="subject",
-                    extraction_text="The quick brown fox",
-                    char_interval=lx.data.CharInterval(start_pos=0, end_pos=19),
-                    attributes={
-                        "type": "noun_phrase",
-                        "role": "主语",
-                        "description": "句子的执行者"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="verb",
-                    extraction_text="jumps",
-                    char_interval=lx.data.CharInterval(start_pos=20, end_pos=25),
-                    attributes={
-                        "type": "intransitive_verb",
-                        "tense": "present",
-                        "role": "谓语",
-                        "description": "描述动作"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="adverbial",
-                    extraction_text="over the lazy dog",
-                    char_interval=lx.data.CharInterval(start_pos=26, end_pos=43),
-                    attributes={
-                        "type": "prepositional_phrase",
-                        "role": "状语",
-                        "description": "修饰动词，表示地点"
-                    }
-                ),
+                    extraction_class=extraction_class,
+                    extraction_text=extraction_text,
+                    char_interval=lx.data.CharInterval(start_pos=start_pos, end_pos=end_pos),
+                    attributes=attributes
+                )
+                for extraction_class, extraction_text, start_pos, end_pos, attributes in extractions
             ]
+        )
+        for text, extractions in raw
+    ]
+
+
+_GRAMMAR_RAW = (
+    (
+        "The quick brown fox jumps over the lazy dog.",
+        (
+            ("subject", "The quick brown fox", 0, 19, {
+                "type": "noun_phrase",
+                "role": "主语",
+                "description": "句子的执行者"
+            }),
+            ("verb", "jumps", 20, 25, {
+                "type": "intransitive_verb",
+                "tense": "present",
+                "role": "谓语",
+                "description": "描述动作"
+            }),
+            ("adverbial", "over the lazy dog", 26, 43, {
+                "type": "prepositional_phrase",
+                "role": "状语",
+                "description": "修饰动词，表示地点"
+            }),
         ),
-        lx.data.ExampleData(
-            text="She gave me a beautiful gift yesterday.",
-            extractions=[
-                lx.data.Extraction(
-                    extraction_class="subject",
-                    extraction_text="She",
-                    char_interval=lx.data.CharInterval(start_pos=0, end_pos=3),
-                    attributes={
-                        "type": "pronoun",
-                        "role": "主语",
-                        "description": "句子的执行者"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="verb",
-                    extraction_text="gave",
-                    char_interval=lx.data.CharInterval(start_pos=4, end_pos=8),
-                    attributes={
-                        "type": "transitive_verb",
-                        "tense": "past",
-                        "role": "谓语",
-                        "description": "描述动作"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="indirect_object",
-                    extraction_text="me",
-                    char_interval=lx.data.CharInterval(start_pos=9, end_pos=11),
-                    attributes={
-                        "type": "pronoun",
-                        "role": "间接宾语",
-                        "description": "动作的接受者"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="direct_object",
-                    extraction_text="a beautiful gift",
-                    char_interval=lx.data.CharInterval(start_pos=12, end_pos=28),
-                    attributes={
-                        "type": "noun_phrase",
-                        "role": "直接宾语",
-                        "description": "动作的对象"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="adverbial",
-                    extraction_text="yesterday",
-                    char_interval=lx.data.CharInterval(start_pos=29, end_pos=38),
-                    attributes={
-                        "type": "time_adverb",
-                        "role": "状语",
-                        "description": "修饰动词，表示时间"
-                    }
-                ),
-            ]
+    ),
+    (
+        "She gave me a beautiful gift yesterday.",
+        (
+            ("subject", "She", 0, 3, {
+                "type": "pronoun",
+                "role": "主语",
+                "description": "句子的执行者"
+            }),
+            ("verb", "gave", 4, 8, {
+                "type": "transitive_verb",
+                "tense": "past",
+                "role": "谓语",
+                "description": "描述动作"
+            }),
+            ("indirect_object", "me", 9, 11, {
+                "type": "pronoun",
+                "role": "间接宾语",
+                "description": "动作的接受者"
+            }),
+            ("direct_object", "a beautiful gift", 12, 28, {
+                "type": "noun_phrase",
+                "role": "直接宾语",
+                "description": "动作的对象"
+            }),
+            ("adverbial", "yesterday", 29, 38, {
+                "type": "time_adverb",
+                "role": "状语",
+                "description": "修饰动词，表示时间"
+            }),
         ),
-    ]
+    ),
+)
 
 
+@lru_cache(maxsize=1)
+def get_grammar_examples():
+    """
+    语法成分分析示例
+    包括：主语、谓语、宾语、定语、状语、补语
+    注意：所有示例都包含精确的位置信息（start_char, end_char）
+    示例数据是静态的，只构建一次，之后返回同一个列表（请勿修改）
+    """
+    return _build_examples(_GRAMMAR_RAW)
+
+
+_PHRASE_RAW = (
+    (
+        "I'm looking forward to hearing from you soon.",
+        (
+            ("phrasal_verb", "looking forward to", 4, 22, {
+                "type": "固定搭配",
+                "meaning": "期待",
+                "usage": "look forward to + 动名词",
+                "level": "中级"
+            }),
+            ("phrasal_verb", "hearing from", 23, 35, {
+                "type": "动词短语",
+                "meaning": "收到...的来信",
+                "usage": "hear from + 人",
+                "level": "基础"
+            }),
+        ),
+    ),
+    (
+        "She decided to give up smoking for health reasons.",
+        (
+            ("phrasal_verb", "give up", 18, 25, {
+                "type": "短语动词",
+                "meaning": "放弃",
+                "usage": "give up + 动名词/名词",
+                "level": "基础"
+            }),
+        ),
+    ),
+    (
+        "It's raining cats and dogs outside.",
+        (
+            ("idiom", "raining cats and dogs", 5, 26, {
+                "type": "习惯用语",
+                "meaning": "倾盆大雨",
+                "usage": "形容雨下得很大",
+                "level": "高级"
+            }),
+        ),
+    ),
+)
+
+
+@lru_cache(maxsize=1)
 def get_phrase_examples():
     """
     固定搭配识别示例
     包括：短语动词、固定搭配、习惯用语
     注意：包含精确的位置信息
     """
-    return [
-        lx.data.ExampleData(
-            text="I'm looking forward to hearing from you soon.",
-            extractions=[
-                lx.data.Extraction(
-                    extraction_class="phrasal_verb",
-                    extraction_text="looking forward to",
-                    char_interval=lx.data.CharInterval(start_pos=4, end_pos=22),
-                    attributes={
-                        "type": "固定搭配",
-                        "meaning": "期待",
-                        "usage": "look forward to + 动名词",
-                        "level": "中级"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="phrasal_verb",
-                    extraction_text="hearing from",
-                    char_interval=lx.data.CharInterval(start_pos=23, end_pos=35),
-                    attributes={
-                        "type": "动词短语",
-                        "meaning": "收到...的来信",
-                        "usage": "hear from + 人",
-                        "level": "基础"
-                    }
-                ),
-            ]
-        ),
-        lx.data.ExampleData(
-            text="She decided to give up smoking for health reasons.",
-            extractions=[
-                lx.data.Extraction(
-                    extraction_class="phrasal_verb",
-                    extraction_text="give up",
-                    char_interval=lx.data.CharInterval(start_pos=18, end_pos=25),
-                    attributes={
-                        "type": "短语动词",
-                        "meaning": "放弃",
-                        "usage": "give up + 动名词/名词",
-                        "level": "基础"
-                    }
-                ),
-            ]
+    return _build_examples(_PHRASE_RAW)
+
+
+_KEYWORD_RAW = (
+    (
+        "Photosynthesis is the biological process by which plants convert light energy into chemical energy.",
+        (
+            ("key_word", "Photosynthesis", 0, 14, {
+                "level": "高级",
+                "type": "学术词汇",
+                "meaning": "光合作用",
+                "subject": "生物学",
+                "importance": "高"
+            }),
+            ("key_word", "biological", 22, 32, {
+                "level": "中级",
+                "type": "形容词",
+                "meaning": "生物学的",
+                "subject": "科学",
+                "importance": "中"
+            }),
+            ("key_word", "convert", 62, 69, {
+                "level": "中级",
+                "type": "动词",
+                "meaning": "转换，转化",
+                "subject": "通用",
+                "importance": "中"
+            }),
         ),
-        lx.data.ExampleData(
-            text="It's raining cats and dogs outside.",
-            extractions=[
-                lx.data.Extraction(
-                    extraction_class="idiom",
-                    extraction_text="raining cats and dogs",
-                    char_interval=lx.data.CharInterval(start_pos=5, end_pos=26),
-                    attributes={
-                        "type": "习惯用语",
-                        "meaning": "倾盆大雨",
-                        "usage": "形容雨下得很大",
-                        "level": "高级"
-                    }
-                ),
-            ]
+    ),
+    (
+        "The algorithm demonstrates remarkable efficiency in processing large datasets.",
+        (
+            ("key_word", "algorithm", 4, 13, {
+                "level": "高级",
+                "type": "专业术语",
+                "meaning": "算法",
+                "subject": "计算机科学",
+                "importance": "高"
+            }),
+            ("key_word", "efficiency", 38, 48, {
+                "level": "中级",
+                "type": "名词",
+                "meaning": "效率",
+                "subject": "通用",
+                "importance": "中"
+            }),
         ),
-    ]
+    ),
+)
 
 
+@lru_cache(maxsize=1)
 def get_keyword_examples():
     """
     重点单词标记示例
     包括：高级词汇、学术词汇、专业术语
     注意：包含精确的位置信息
     """
-    return [
-        lx.data.ExampleData(
-            text="Photosynthesis is the biological process by which plants convert light energy into chemical energy.",
-            extractions=[
-                lx.data.Extraction(
-                    extraction_class="key_word",
-                    extraction_text="Photosynthesis",
-                    char_interval=lx.data.CharInterval(start_pos=0, end_pos=14),
-                    attributes={
-                        "level": "高级",
-                        "type": "学术词汇",
-                        "meaning": "光合作用",
-                        "subject": "生物学",
-                        "importance": "高"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="key_word",
-                    extraction_text="biological",
-                    char_interval=lx.data.CharInterval(start_pos=22, end_pos=32),
-                    attributes={
-                        "level": "中级",
-                        "type": "形容词",
-                        "meaning": "生物学的",
-                        "subject": "科学",
-                        "importance": "中"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="key_word",
-                    extraction_text="convert",
-                    char_interval=lx.data.CharInterval(start_pos=62, end_pos=69),
-                    attributes={
-                        "level": "中级",
-                        "type": "动词",
-                        "meaning": "转换，转化",
-                        "subject": "通用",
-                        "importance": "中"
-                    }
-                ),
-            ]
-        ),
-        lx.data.ExampleData(
-            text="The algorithm demonstrates remarkable efficiency in processing large datasets.",
-            extractions=[
-                lx.data.Extraction(
-                    extraction_class="key_word",
-                    extraction_text="algorithm",
-                    char_interval=lx.data.CharInterval(start_pos=4, end_pos=13),
-                    attributes={
-                        "level": "高级",
-                        "type": "专业术语",
-                        "meaning": "算法",
-                        "subject": "计算机科学",
-                        "importance": "高"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="key_word",
-                    extraction_text="efficiency",
-                    char_interval=lx.data.CharInterval(start_pos=38, end_pos=48),
-                    attributes={
-                        "level": "中级",
-                        "type": "名词",
-                        "meaning": "效率",
-                        "subject": "通用",
-                        "importance": "中"
-                    }
-                ),
-            ]
+    return _build_examples(_KEYWORD_RAW)
+
+
+_COMBINED_RAW = (
+    (
+        "The talented student looked up the difficult vocabulary in the dictionary.",
+        (
+            # 语法成分
+            ("subject", "The talented student", 0, 20, {
+                "type": "noun_phrase",
+                "role": "主语"
+            }),
+            ("verb", "looked up", 21, 30, {
+                "type": "phrasal_verb",
+                "role": "谓语"
+            }),
+            ("object", "the difficult vocabulary", 31, 55, {
+                "type": "noun_phrase",
+                "role": "宾语"
+            }),
+            # 固定搭配（和谓语重叠，但从不同角度分析）
+            ("phrasal_verb", "looked up", 21, 30, {
+                "type": "短语动词",
+                "meaning": "查阅",
+                "level": "基础"
+            }),
+            # 重点单词
+            ("key_word", "vocabulary", 45, 55, {
+                "level": "中级",
+                "type": "名词",
+                "meaning": "词汇",
+                "importance": "高"
+            }),
         ),
-    ]
+    ),
+)
 
 
+@lru_cache(maxsize=1)
 def get_combined_examples():
     """
     综合分析示例（包含所有类型）
     注意：包含精确的位置信息，这个例子展示了如何标注同一个词（looked up）的多重功能
     """
-    return [
-        lx.data.ExampleData(
-            text="The talented student looked up the difficult vocabulary in the dictionary.",
-            extractions=[
-                # 语法成分
-                lx.data.Extraction(
-                    extraction_class="subject",
-                    extraction_text="The talented student",
-                    char_interval=lx.data.CharInterval(start_pos=0, end_pos=20),
-                    attributes={
-                        "type": "noun_phrase",
-                        "role": "主语"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="verb",
-                    extraction_text="looked up",
-                    char_interval=lx.data.CharInterval(start_pos=21, end_pos=30),
-                    attributes={
-                        "type": "phrasal_verb",
-                        "role": "谓语"
-                    }
-                ),
-                lx.data.Extraction(
-                    extraction_class="object",
-                    extraction_text="the difficult vocabulary",
-                    char_interval=lx.data.CharInterval(start_pos=31, end_pos=55),
-                    attributes={
-                        "type": "noun_phrase",
-                        "role": "宾语"
-                    }
-                ),
-                # 固定搭配（和谓语重叠，但从不同角度分析）
-                lx.data.Extraction(
-                    extraction_class="phrasal_verb",
-                    extraction_text="looked up",
-                    char_interval=lx.data.CharInterval(start_pos=21, end_pos=30),
-                    attributes={
-                        "type": "短语动词",
-                        "meaning": "查阅",
-                        "level": "基础"
-                    }
-                ),
-                # 重点单词
-                lx.data.Extraction(
-                    extraction_class="key_word",
-                    extraction_text="vocabulary",
-                    char_interval=lx.data.CharInterval(start_pos=45, end_pos=55),
-                    attributes={
-                        "level": "中级",
-                        "type": "名词",
-                        "meaning": "词汇",
-                        "importance": "高"
-                    }
-                ),
-            ]
-        ),
-    ]
+    return _build_examples(_COMBINED_RAW)
 
 
 # 预设的提示词模板
@@ -390,3 +323,19 @@ PROMPTS = {
 """
 }
 
+
+# 界面中的示例句子
+SAMPLE_SENTENCES = [
+    "I can share another truth with you. Because of a global supply chain shortage, there are not enough folding chairs. So half of you had to sit on blankets today. Fortunately, our staff, who are amazing, creative, resilient, and made this commencement become a reality.",
+    "Photosynthesis is the biological process by which plants convert light energy into chemical energy, creating oxygen as a byproduct, which supports life on Earth.",
+    "The algorithm demonstrates remarkable efficiency in processing large datasets, utilizing advanced heuristics to minimize computational complexity while maintaining high accuracy.",
+    "Despite the heavy rain and strong winds, the dedicated team continued their rescue mission, determined to save every stranded villager before nightfall.",
+    "Understanding quantum mechanics requires abandoning classical intuition, as particles exist in superposition states until observed, challenging our fundamental perception of reality.",
+    "The quick brown fox jumps over the lazy dog."
+]
+
+# 示例按钮标签（过长的句子截断显示）
+SAMPLE_BUTTON_LABELS = [
+    f"{i}. {s[:40]}..." if len(s) > 40 else f"{i}. {s}"
+    for i, s in enumerate(SAMPLE_SENTENCES, 1)
+]
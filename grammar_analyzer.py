@@ -3,11 +3,295 @@
 基于 LangExtract 的语法分析实现
 """
 
+import io
+import copy
+import html
 import os
+import re
+import json
+import time
+import shutil
+import uuid
+import atexit
+import zlib
+import pickle
+import sqlite3
+import hashlib
+import asyncio
+import threading
+import dataclasses
+from collections import Counter, OrderedDict, defaultdict
 import langextract as lx
-from typing import List, Dict, Any, Optional
+import semantic_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from operator import itemgetter
+from typing import List, Dict, Any, Optional, Callable, Iterable, Iterator, NamedTuple, Tuple
 import tempfile
 
+# numpy 为可选依赖，用于大量提取的向量化筛选
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# orjson 为可选依赖，用于加速 JSONL 序列化；未安装时使用标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 候选句末：. ! ? 后可带引号/括号，其后为空白或文本末尾
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"'”’)\]]*(?=\s|\Z)")
+
+# 候选句末之后的第一个非空白字符
+_NEXT_CHAR_RE = re.compile(r"\s+(\S)")
+
+# 句点前的单词（可含缩写内部的句点，如 p.m / e.g）
+_WORD_BEFORE_RE = re.compile(r"([A-Za-z][A-Za-z.]*)$")
+
+# 以句点结尾但不表示句末的常见缩写（小写，不含末尾句点）
+_ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "vs", "etc",
+    "no", "fig", "inc", "ltd", "co", "e.g", "i.e", "a.m", "p.m", "u.s", "u.k",
+})
+
+# 超过该长度的文本才按句子分块分析；与 LangExtract 默认的分块大小一致
+CHUNK_MAX_CHARS = 1000
+
+# 可重试的 HTTP 状态码：限流（429）和服务端临时错误（5xx）
+_RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+# 默认的 LLM 响应缓存位置
+DEFAULT_CACHE_PATH = os.path.join(".cache", "responses.sqlite3")
+
+def locate_text(
+    text: str,
+    needle: str,
+    hint: int = 0
+) -> Optional[Tuple[int, int]]:
+    """
+    在文本中定位片段（忽略大小写和空白差异）
+    
+    Args:
+        text: 原始文本
+        needle: 要查找的片段
+        hint: 期望位置，存在多处匹配时取离它最近的一处
+        
+    Returns:
+        (开始, 结束) 位置，找不到时返回 None
+    """
+    words = (needle or "").split()
+    if not words:
+        return None
+    
+    best = None
+    pattern = r"\s+".join(re.escape(w) for w in words)
+    for match in re.finditer(pattern, text, re.IGNORECASE):
+        if best is None or abs(match.start() - hint) < abs(best.start() - hint):
+            best = match
+    
+    return (best.start(), best.end()) if best else None
+
+
+def is_retryable_error(error: BaseException) -> bool:
+    """
+    判断错误是否值得重试（限流、服务端临时错误、网络超时或连接失败）
+    
+    沿异常链（__cause__ / __context__ 以及 LangExtract 异常的 original）按状态码和异常类型判断，
+    不匹配错误信息文本，避免信息中恰好含有 "500" 等数字的错误被误判
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, (TimeoutError, ConnectionError)):
+            return True
+        for attr in ("code", "status_code"):
+            status = getattr(error, attr, None)
+            if isinstance(status, int) and status in _RETRYABLE_STATUS:
+                return True
+        error = getattr(error, "original", None) or error.__cause__ or error.__context__
+    return False
+
+
+def call_with_retry(
+    fn: Callable[..., Any],
+    *args: Any,
+    max_retries: int = 3
+) -> Any:
+    """
+    调用 fn(*args)，遇到可重试的错误时指数退避后重试
+    
+    Args:
+        fn: 要调用的函数
+        *args: 传给 fn 的参数
+        max_retries: 最大重试次数
+        
+    Returns:
+        fn 的返回值
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == max_retries or not is_retryable_error(e):
+                raise
+            time.sleep(2 ** attempt)  # 指数退避：1s, 2s, 4s...
+
+
+def _dumps_jsonl(obj: Any) -> bytes:
+    """序列化为一行 UTF-8 编码的紧凑 JSON（带换行），无法直接序列化的值按 str() 输出"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+
+
+def _with_char_interval(
+    extraction: lx.data.Extraction,
+    char_interval: Optional[lx.data.CharInterval]
+) -> lx.data.Extraction:
+    """复制提取结果并替换位置信息
+
+    Extraction 的构造参数与字段不一致（token_interval / _token_interval），
+    不能用 dataclasses.replace，这里浅拷贝后再设置位置
+    """
+    shifted = copy.copy(extraction)
+    shifted.char_interval = char_interval
+    return shifted
+
+
+def realign_document(
+    document: lx.data.AnnotatedDocument,
+    text: str
+) -> Optional[lx.data.AnnotatedDocument]:
+    """
+    将复用的分析结果的位置信息重新对齐到当前文本
+    
+    复用的结果可能来自与当前文本略有差异的原文，位置需按提取文本在当前文本中重新定位；
+    原本就没有位置信息的提取保持原样
+    
+    Args:
+        document: 缓存的分析结果
+        text: 当前文本
+        
+    Returns:
+        位置对齐到当前文本的分析结果；有提取在当前文本中找不到时返回 None（应视为未命中）
+    """
+    extractions = []
+    
+    for e in document.extractions:
+        ci = e.char_interval
+        if not ci or ci.start_pos is None or ci.end_pos is None:
+            extractions.append(e)
+            continue
+        
+        span = locate_text(text, e.extraction_text, ci.start_pos)
+        if span is None:
+            return None
+        extractions.append(_with_char_interval(e, lx.data.CharInterval(start_pos=span[0], end_pos=span[1])))
+    
+    return lx.data.AnnotatedDocument(text=text, extractions=extractions)
+
+
+def merge_intervals(
+    spans: Iterable[Tuple]
+) -> List[Tuple[int, int, List[Tuple]]]:
+    """
+    合并重叠的区间（首尾相接的区间不合并）
+    
+    Args:
+        spans: 前两项为 (开始, 结束) 的区间记录
+        
+    Returns:
+        按开始位置排序、互不重叠的 (开始, 结束, 区间内的记录) 列表，
+        记录按开始位置排序，开始位置相同的保持传入顺序
+    """
+    merged = []
+    for span in sorted(spans, key=itemgetter(0)):
+        start, end = span[0], span[1]
+        if merged and start < merged[-1][1]:
+            last_start, last_end, members = merged[-1]
+            members.append(span)
+            if end > last_end:
+                merged[-1] = (last_start, end, members)
+        else:
+            merged.append((start, end, [span]))
+    return merged
+
+
+class ResponseCache:
+    """基于 SQLite 的 LLM 响应缓存（跨进程重启保留，带过期时间和 LRU 淘汰）"""
+    
+    def __init__(
+        self,
+        path: str = DEFAULT_CACHE_PATH,
+        ttl: int = 7 * 24 * 3600,
+        max_entries: int = 10000
+    ):
+        """
+        初始化缓存
+        
+        Args:
+            path: SQLite 数据库文件路径
+            ttl: 过期时间（秒），从写入时开始计算
+            max_entries: 最大条目数，超出后淘汰最久未访问的条目
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS kv ("
+            "key BLOB PRIMARY KEY, value BLOB, created INTEGER, accessed INTEGER)"
+        )
+        self._conn.commit()
+    
+    def get(self, key: bytes) -> Optional[Any]:
+        """读取缓存，未命中或已过期返回 None"""
+        now = int(time.time())
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, created FROM kv WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            value, created = row
+            if now - created > self.ttl:
+                self._conn.execute("DELETE FROM kv WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            
+            self._conn.execute("UPDATE kv SET accessed = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+        
+        try:
+            return pickle.loads(zlib.decompress(value))
+        except Exception:
+            return None
+    
+    def set(self, key: bytes, value: Any) -> None:
+        """写入缓存，超出容量时淘汰最久未访问的条目"""
+        now = int(time.time())
+        blob = zlib.compress(pickle.dumps(value))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO kv (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, blob, now, now)
+            )
+            overflow = self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM kv WHERE key IN "
+                    "(SELECT key FROM kv ORDER BY accessed LIMIT ?)",
+                    (overflow,)
+                )
+            self._conn.commit()
+
 
 class GrammarAnalyzer:
     """语法分析器"""
@@ -15,7 +299,9 @@ class GrammarAnalyzer:
     def __init__(
         self,
         api_key: Optional[str] = None,
-        model_id: str = "gemini-2.5-flash"
+        model_id: str = "gemini-2.5-flash",
+        cache_path: Optional[str] = DEFAULT_CACHE_PATH,
+        semantic_threshold: Optional[float] = None
     ):
         """
         初始化语法分析器
@@ -23,14 +309,32 @@ class GrammarAnalyzer:
         Args:
             api_key: API密钥（如果不提供，会从环境变量读取）
             model_id: 使用的模型ID
+            cache_path: 响应缓存文件路径，为 None 时不使用缓存
+            semantic_threshold: 语义缓存的余弦相似度阈值（如 0.90），为 None 时只做精确匹配
         """
         self.api_key = api_key or os.environ.get('LANGEXTRACT_API_KEY')
         self.model_id = model_id
+        self.semantic_threshold = semantic_threshold
+        self._cache = ResponseCache(cache_path) if cache_path else None
+        self._semantic = None
+        # (id(examples), prompt) -> (examples, 上下文键)；保留 examples 引用，保证 id 不被复用
+        self._examples_cache: Dict[Tuple[int, str], Tuple[List[lx.data.ExampleData], bytes]] = {}
         
         if not self.api_key:
             raise ValueError(
                 "未找到 API Key。请设置 LANGEXTRACT_API_KEY 环境变量或传入 api_key 参数。"
             )
+        if semantic_threshold is not None:
+            if not semantic_cache.is_available() or self._cache is None:
+                raise ValueError(
+                    "语义缓存需要安装 sentence-transformers，并启用响应缓存（cache_path）。"
+                )
+            # 与响应缓存存放在同一个数据库文件中，过期时间一致
+            self._semantic = semantic_cache.SemanticCache(cache_path, ttl=self._cache.ttl)
+        
+        # 可视化用的临时目录，整个分析器生命周期内复用，进程退出时删除
+        self._viz_dir = tempfile.mkdtemp(prefix='langextract_')
+        atexit.register(shutil.rmtree, self._viz_dir, ignore_errors=True)
     
     def analyze_grammar(
         self,
@@ -49,6 +353,24 @@ class GrammarAnalyzer:
         Returns:
             分析结果
         """
+        cache_key = None
+        embedding = None
+        if self._cache:
+            context_key = self.context_key(prompt, examples)
+            cache_key = hashlib.sha256(context_key + text.encode("utf-8")).digest()
+            cached = self._cache.get(cache_key)
+            if cached is not None:
+                return cached
+            
+            # 精确匹配未命中时，查找语义相近的已分析文本
+            if self._semantic is not None:
+                embedding = semantic_cache.embed(text)
+                cached = self._semantic.lookup(text, context_key, self.semantic_threshold, embedding)
+                if cached is not None:
+                    cached = realign_document(cached, text)
+                    if cached is not None:
+                        return cached
+        
         try:
             result = lx.extract(
                 text_or_documents=text,
@@ -59,9 +381,163 @@ class GrammarAnalyzer:
                 fence_output=False,  # Gemini 不需要 fence
                 use_schema_constraints=True  # 使用 schema 约束
             )
-            return result
         except Exception as e:
-            raise Exception(f"分析失败: {str(e)}")
+            raise Exception(f"分析失败: {str(e)}") from e
+        
+        if cache_key is not None:
+            self._cache.set(cache_key, result)
+            if self._semantic is not None:
+                self._semantic.store(text, context_key, result, embedding)
+        return result
+    
+    def context_key(
+        self,
+        prompt: str,
+        examples: List[lx.data.ExampleData]
+    ) -> bytes:
+        """
+        由提示词、模型和示例生成缓存上下文键（不包含 API Key）
+        
+        示例通常是同一个列表对象反复传入，按对象 id 缓存结果，避免每次调用都重新序列化
+        """
+        cache_key = (id(examples), prompt)
+        cached = self._examples_cache.get(cache_key)
+        if cached is not None and cached[0] is examples:
+            return cached[1]
+        
+        payload = json.dumps(
+            {
+                "prompt": prompt,
+                "model": self.model_id,
+                "examples": [dataclasses.asdict(e) for e in examples]
+            },
+            sort_keys=True,
+            ensure_ascii=False,
+            default=str
+        )
+        context_key = hashlib.sha256(payload.encode("utf-8")).digest()
+        if len(self._examples_cache) >= 64:
+            # 调用方每次传入新列表时避免无限增长
+            self._examples_cache.clear()
+        self._examples_cache[cache_key] = (examples, context_key)
+        return context_key
+    
+    def analyze_grammar_batch(
+        self,
+        texts: List[str],
+        prompt: str,
+        examples: List[lx.data.ExampleData],
+        max_workers: int = 8,
+        max_retries: int = 3
+    ) -> List[lx.data.AnnotatedDocument]:
+        """
+        并发分析多条文本（每条仍先查缓存）
+        
+        Args:
+            texts: 要分析的文本列表
+            prompt: 分析提示词
+            examples: 示例数据
+            max_workers: 最大并发数
+            max_retries: 遇到限流或服务端错误时的最大重试次数
+            
+        Returns:
+            与 texts 顺序一致的分析结果列表
+        """
+        def analyze(text: str) -> lx.data.AnnotatedDocument:
+            return call_with_retry(self.analyze_grammar, text, prompt, examples, max_retries=max_retries)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(analyze, texts))
+    
+    async def aanalyze_grammar(
+        self,
+        text: str,
+        prompt: str,
+        examples: List[lx.data.ExampleData]
+    ) -> lx.data.AnnotatedDocument:
+        """
+        analyze_grammar 的异步版本，可与其他调用通过 asyncio.gather 并发执行
+        
+        LangExtract 只提供同步接口，这里在线程池中执行阻塞的 API 调用，不阻塞事件循环
+        
+        Args:
+            text: 要分析的文本
+            prompt: 分析提示词
+            examples: 示例数据
+            
+        Returns:
+            分析结果
+        """
+        return await asyncio.to_thread(self.analyze_grammar, text, prompt, examples)
+    
+    def _stream_documents(
+        self,
+        text: str,
+        prompt: str,
+        examples: List[lx.data.ExampleData],
+        max_workers: int
+    ) -> Iterator[lx.data.AnnotatedDocument]:
+        """分块分析文本，按完成顺序逐块产出结果，提取位置已换算为原文中的位置"""
+        results = iter_chunk_results(
+            text,
+            lambda chunk: self.analyze_grammar(chunk, prompt, examples),
+            max_workers=max_workers
+        )
+        for offset, document in results:
+            extractions = []
+            for e in document.extractions:
+                ci = e.char_interval
+                # 没有位置信息的提取保持原样
+                if ci and ci.start_pos is not None and ci.end_pos is not None:
+                    ci = lx.data.CharInterval(start_pos=ci.start_pos + offset, end_pos=ci.end_pos + offset)
+                extractions.append(_with_char_interval(e, ci))
+            yield lx.data.AnnotatedDocument(text=text, extractions=extractions)
+    
+    def analyze_grammar_stream(
+        self,
+        text: str,
+        prompt: str,
+        examples: List[lx.data.ExampleData],
+        max_workers: int = 4
+    ) -> Iterator[lx.data.Extraction]:
+        """
+        分块分析文本，每块完成后立即逐条产出提取结果（短文本只有一块）
+        
+        每块单独走响应缓存，重复查询时整段文本可直接从缓存重放
+        
+        Args:
+            text: 要分析的文本
+            prompt: 分析提示词
+            examples: 示例数据
+            max_workers: 最大并发数
+            
+        Yields:
+            提取结果（位置为原文中的位置）
+        """
+        for document in self._stream_documents(text, prompt, examples, max_workers):
+            yield from document.extractions
+    
+    def stream_grammar(
+        self,
+        text: str,
+        prompt: str,
+        examples: List[lx.data.ExampleData],
+        max_workers: int = 4
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        analyze_grammar_stream 的格式化版本：每块完成后产出该块格式化后的提取结果
+        
+        Args:
+            text: 要分析的文本
+            prompt: 分析提示词
+            examples: 示例数据
+            max_workers: 最大并发数
+            
+        Yields:
+            单个文本块格式化后的提取结果（位置为原文中的位置）
+        """
+        for document in self._stream_documents(text, prompt, examples, max_workers):
+            yield self.format_extractions(document)
     
     def generate_visualization(
         self,
@@ -76,71 +552,28 @@ class GrammarAnalyzer:
         Returns:
             HTML 内容字符串
         """
-        import json
-        import shutil
-        
-        temp_dir = None
+        # 每次调用使用唯一文件名，避免并发调用互相覆盖
+        output_path = os.path.join(self._viz_dir, f"{uuid.uuid4().hex}.jsonl")
         try:
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp(prefix='langextract_')
-            output_name = "grammar_analysis"
-            
-            # 方案1: 使用 LangExtract 的保存方法
-            try:
-                lx.io.save_annotated_documents(
-                    [result],
-                    output_name=output_name,
-                    output_dir=temp_dir
-                )
-                
-                # 检查多种可能的文件名
-                possible_files = [
-                    os.path.join(temp_dir, f"{output_name}.jsonl"),
-                    os.path.join(temp_dir, "grammar_analysis.jsonl"),
-                    os.path.join(temp_dir, "annotated_documents.jsonl"),
+            # 直接写出 LangExtract 可读取的 JSONL
+            doc_dict = {
+                "text": result.text,
+                "extractions": [
+                    {
+                        "extraction_class": e.extraction_class,
+                        "extraction_text": e.extraction_text,
+                        "attributes": e.attributes,
+                        "char_interval": {
+                            "start_pos": e.char_interval.start_pos if e.char_interval else 0,
+                            "end_pos": e.char_interval.end_pos if e.char_interval else len(e.extraction_text)
+                        },
+                    }
+                    for e in result.extractions
                 ]
-                
-                output_path = None
-                for path in possible_files:
-                    if os.path.exists(path):
-                        output_path = path
-                        break
-                
-                if not output_path:
-                    # 列出临时目录中的文件
-                    files = os.listdir(temp_dir) if os.path.exists(temp_dir) else []
-                    raise Exception(f"未找到 JSONL 文件。目录内容: {files}")
-                
-            except Exception as save_error:
-                # 方案2: 手动创建 JSONL 文件
-                output_path = os.path.join(temp_dir, f"{output_name}.jsonl")
-                
-                # 手动构建 JSONL 格式
-                doc_dict = {
-                    "text": result.text,
-                    "extractions": [
-                        {
-                            "extraction_class": e.extraction_class,
-                            "extraction_text": e.extraction_text,
-                            "attributes": e.attributes,
-                            "char_interval": {
-                                "start_pos": e.char_interval.start_pos if e.char_interval else 0,
-                                "end_pos": e.char_interval.end_pos if e.char_interval else len(e.extraction_text)
-                            },
-                        }
-                        for e in result.extractions
-                    ]
-                }
-                
-                with open(output_path, 'w', encoding='utf-8') as f:
-                    json.dump(doc_dict, f, ensure_ascii=False)
-                    f.write('\n')
+            }
             
-            # 验证文件内容
-            if os.path.exists(output_path):
-                file_size = os.path.getsize(output_path)
-                if file_size == 0:
-                    raise Exception("JSONL 文件为空")
+            with open(output_path, 'wb') as f:
+                f.write(_dumps_jsonl(doc_dict))
             
             # 生成可视化
             html_content = lx.visualize(output_path)
@@ -154,25 +587,14 @@ class GrammarAnalyzer:
             return html_content
             
         except Exception as e:
-            error_msg = f"可视化生成失败: {str(e)}"
-            
-            # 添加调试信息
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    files = os.listdir(temp_dir)
-                    error_msg += f"\n临时目录文件: {files}"
-                except:
-                    pass
-            
-            raise Exception(error_msg)
+            raise Exception(f"可视化生成失败: {str(e)}")
             
         finally:
-            # 清理临时文件
-            if temp_dir and os.path.exists(temp_dir):
-                try:
-                    shutil.rmtree(temp_dir)
-                except:
-                    pass
+            # 清理临时文件（目录保留复用）
+            try:
+                os.unlink(output_path)
+            except OSError:
+                pass
     
     def format_extractions(
         self,
@@ -187,24 +609,19 @@ class GrammarAnalyzer:
         Returns:
             格式化后的提取结果列表
         """
-        formatted = []
-        
-        for extraction in result.extractions:
-            # 尝试获取位置信息
-            start_pos = extraction.char_interval.start_pos if extraction.char_interval else 0
-            end_pos = extraction.char_interval.end_pos if extraction.char_interval else 0
-            
-            formatted.append({
-                "类型": extraction.extraction_class,
-                "文本": extraction.extraction_text,
-                "属性": extraction.attributes,
+        # 没有位置信息的提取位置记为 0
+        return [
+            {
+                "类型": e.extraction_class,
+                "文本": e.extraction_text,
+                "属性": e.attributes,
                 "位置": {
-                    "开始": start_pos,
-                    "结束": end_pos
+                    "开始": ci.start_pos if (ci := e.char_interval) else 0,
+                    "结束": ci.end_pos if ci else 0
                 }
-            })
-        
-        return formatted
+            }
+            for e in result.extractions
+        ]
     
     def get_statistics(
         self,
@@ -222,17 +639,15 @@ class GrammarAnalyzer:
         extractions = result.extractions
         
         # 按类型统计
-        type_counts = {}
-        for extraction in extractions:
-            extraction_type = extraction.extraction_class
-            type_counts[extraction_type] = type_counts.get(extraction_type, 0) + 1
-        
-        # 计算覆盖率（安全处理位置信息）
-        total_chars = 0
-        for e in extractions:
-            start = e.char_interval.start_pos if e.char_interval else 0
-            end = e.char_interval.end_pos if e.char_interval else 0
-            total_chars += (end - start)
+        type_counts = dict(Counter(e.extraction_class for e in extractions))
+        
+        # 计算覆盖率（重叠部分只计一次，没有位置信息的提取不计入）
+        merged = merge_intervals(
+            (ci.start_pos, ci.end_pos)
+            for e in extractions
+            if (ci := e.char_interval) and ci.start_pos is not None and ci.end_pos is not None
+        )
+        total_chars = sum(end - start for start, end, _ in merged)
         
         coverage = f"{total_chars / len(result.text) * 100:.1f}%" if len(result.text) > 0 else "0%"
         
@@ -244,222 +659,220 @@ class GrammarAnalyzer:
         }
 
 
-def format_result_for_display(
-    extractions: List[Dict[str, Any]],
-    group_by: str = "类型"
-) -> Dict[str, List[Dict[str, Any]]]:
+class BatchProcessor:
+    """批量分析器：以有限并发处理多条文本，并汇报进度"""
+    
+    def __init__(
+        self,
+        analyze_fn: Callable[[str], Any],
+        max_concurrency: int = 10,
+        max_retries: int = 3
+    ):
+        """
+        初始化批量分析器
+        
+        Args:
+            analyze_fn: 分析单条文本的（阻塞）函数
+            max_concurrency: 同时进行的最大调用数，避免触发 API 限流
+            max_retries: 单条文本遇到限流或服务端临时错误时的最大重试次数
+        """
+        self.analyze_fn = analyze_fn
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+    
+    async def aprocess(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[Any]:
+        """
+        并发分析所有文本
+        
+        Args:
+            texts: 待分析的文本列表
+            on_progress: 进度回调，参数为 (已完成数, 总数)
+            
+        Returns:
+            与 texts 顺序一致的结果列表；单条失败时对应位置为异常对象
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        done = 0
+        
+        async def run_one(text: str) -> Any:
+            nonlocal done
+            async with semaphore:
+                try:
+                    result = await asyncio.to_thread(
+                        call_with_retry, self.analyze_fn, text, max_retries=self.max_retries
+                    )
+                except Exception as e:
+                    result = e
+            done += 1
+            if on_progress:
+                on_progress(done, len(texts))
+            return result
+        
+        return await asyncio.gather(*(run_one(text) for text in texts))
+    
+    def process(
+        self,
+        texts: List[str],
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[Any]:
+        """aprocess 的同步版本"""
+        return asyncio.run(self.aprocess(texts, on_progress))
+
+
+def _is_sentence_end(text: str, match: re.Match) -> bool:
+    """判断候选句末是否真的结束了句子（排除缩写、首字母和引语中的标点）"""
+    following = _NEXT_CHAR_RE.match(text, match.end())
+    if following is None:
+        return True
+    
+    # 后面紧跟小写字母，说明句子还在继续（如 He said "Hi!" and left）
+    if following.group(1).islower():
+        return False
+    
+    # 单个句点前是缩写或首字母（如 Dr. / p.m. / J.）时不断句
+    if match.group().rstrip("\"'”’)]") == ".":
+        word = _WORD_BEFORE_RE.search(text, max(0, match.start() - 20), match.start())
+        if word:
+            word = word.group(1).lower()
+            if word in _ABBREVIATIONS or len(word) == 1:
+                return False
+    return True
+
+
+def split_sentences(text: str) -> List[Tuple[int, str]]:
     """
-    格式化结果用于展示
+    按句子切分文本（常见缩写、首字母缩写和句中引语不会被切开）
     
     Args:
-        extractions: 提取结果列表
-        group_by: 分组依据（类型/难度等）
+        text: 原始文本
         
     Returns:
-        分组后的结果
+        (句子在原文中的起始位置, 句子) 列表
     """
-    grouped = {}
+    sentences = []
+    pos = 0
     
-    for extraction in extractions:
-        if group_by == "类型":
-            key = extraction["类型"]
-        elif group_by == "难度":
-            key = extraction["属性"].get("level", "未知")
-        else:
-            key = "全部"
-        
-        if key not in grouped:
-            grouped[key] = []
-        grouped[key].append(extraction)
+    for match in _SENTENCE_END_RE.finditer(text):
+        if match.start() < pos or not _is_sentence_end(text, match):
+            continue
+        start = match.end() - len(text[pos:match.end()].lstrip())
+        sentences.append((start, text[start:match.end()]))
+        pos = match.end()
     
-    return grouped
+    tail = text[pos:]
+    if tail.strip():
+        start = pos + len(tail) - len(tail.lstrip())
+        sentences.append((start, text[start:].rstrip()))
+    
+    return sentences
 
 
-def create_simple_html_visualization(
+def split_chunks(
     text: str,
-    extractions: List[Dict[str, Any]],
-    title: str = "语法分析结果"
-) -> str:
+    max_chars: int = CHUNK_MAX_CHARS
+) -> List[Tuple[int, str]]:
     """
-    创建简单的 HTML 可视化（不依赖 LangExtract）
+    把文本切分为用于分析的文本块
+    
+    相邻句子合并到同一块中，直到超过 max_chars，短文本整体作为一块，
+    这样每个句子都带着完整的上下文分析，也不会为每个句子重复发送提示词和示例
     
     Args:
         text: 原始文本
-        extractions: 提取结果列表
-        title: 标题
+        max_chars: 每块的最大字符数（单个句子超长时独占一块）
         
     Returns:
-        HTML 字符串
+        (文本块在原文中的起始位置, 文本块) 列表
     """
-    # 颜色映射
-    color_map = {
-        "subject": {"bg": "#FFE5E5", "border": "#FF6B6B", "label": "主语"},
-        "verb": {"bg": "#E5F9F9", "border": "#4ECDC4", "label": "谓语"},
-        "object": {"bg": "#E5F0FF", "border": "#45B7D1", "label": "宾语"},
-        "direct_object": {"bg": "#E5F0FF", "border": "#45B7D1", "label": "直接宾语"},
-        "indirect_object": {"bg": "#E8F5E9", "border": "#95D5B2", "label": "间接宾语"},
-        "adverbial": {"bg": "#FFF3E0", "border": "#FFA07A", "label": "状语"},
-        "phrasal_verb": {"bg": "#E8F5E9", "border": "#98D8C8", "label": "短语动词"},
-        "key_word": {"bg": "#FFF9E6", "border": "#F7DC6F", "label": "重点词汇"},
-        "idiom": {"bg": "#FFEEE5", "border": "#DDA15E", "label": "习语"},
-        "attributive": {"bg": "#F5E6D3", "border": "#BC6C25", "label": "定语"},
-        "complement": {"bg": "#E0F7FA", "border": "#A8DADC", "label": "补语"},
-    }
-    
-    # 构建 HTML
-    html_parts = [
-        "<!DOCTYPE html>",
-        "<html>",
-        "<head>",
-        '<meta charset="UTF-8">',
-        f"<title>{title}</title>",
-        "<style>",
-        "body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif; padding: 20px; background: #f8f9fa; }",
-        ".container { max-width: 1200px; margin: 0 auto; background: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }",
-        "h1 { color: #2c3e50; margin-bottom: 10px; }",
-        ".subtitle { color: #7f8c8d; margin-bottom: 30px; }",
-        ".text-container { background: #f8f9fa; padding: 20px; border-radius: 8px; line-height: 2; font-size: 16px; margin-bottom: 30px; }",
-        ".highlight { padding: 3px 6px; margin: 0 2px; border-radius: 4px; cursor: help; display: inline-block; transition: transform 0.2s; }",
-        ".highlight:hover { transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.15); }",
-        ".legend { display: flex; flex-wrap: wrap; gap: 15px; margin-bottom: 30px; }",
-        ".legend-item { display: flex; align-items: center; gap: 8px; padding: 8px 15px; border-radius: 6px; background: #f8f9fa; }",
-        ".legend-box { width: 20px; height: 20px; border-radius: 4px; border: 2px solid; }",
-        ".details { margin-top: 30px; }",
-        ".extraction-card { background: #f8f9fa; padding: 20px; margin-bottom: 15px; border-radius: 8px; border-left: 4px solid; }",
-        ".extraction-header { font-weight: bold; font-size: 18px; margin-bottom: 10px; }",
-        ".extraction-text { background: white; padding: 10px 15px; border-radius: 6px; font-family: monospace; margin: 10px 0; }",
-        ".attribute { display: inline-block; margin-right: 15px; margin-top: 5px; }",
-        ".attribute-key { font-weight: bold; color: #7f8c8d; }",
-        ".attribute-value { color: #2c3e50; }",
-        "</style>",
-        "</head>",
-        "<body>",
-        '<div class="container">',
-        f'<h1>{title}</h1>',
-        '<p class="subtitle">点击或悬停查看详细信息</p>',
-    ]
+    chunks = []
+    chunk_start = chunk_end = None
     
-    # 图例
-    used_types = set(e["类型"] for e in extractions)
-    if used_types:
-        html_parts.append('<div class="legend">')
-        for extraction_type in used_types:
-            if extraction_type in color_map:
-                colors = color_map[extraction_type]
-                html_parts.append(
-                    f'<div class="legend-item">'
-                    f'<div class="legend-box" style="background: {colors["bg"]}; border-color: {colors["border"]};"></div>'
-                    f'<span>{colors["label"]} ({extraction_type})</span>'
-                    f'</div>'
-                )
-        html_parts.append('</div>')
+    for start, sentence in split_sentences(text):
+        end = start + len(sentence)
+        if chunk_start is not None and end - chunk_start > max_chars:
+            chunks.append((chunk_start, text[chunk_start:chunk_end]))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = start
+        chunk_end = end
     
-    # 带标注的文本
-    html_parts.append('<div class="text-container">')
+    if chunk_start is not None:
+        chunks.append((chunk_start, text[chunk_start:chunk_end]))
     
-    # 过滤有效的提取
-    valid_extractions = [
-        e for e in extractions
-        if e["位置"]["开始"] is not None and e["位置"]["结束"] is not None
-        and 0 <= e["位置"]["开始"] < e["位置"]["结束"] <= len(text)
-    ]
+    return chunks
+
+
+def iter_chunk_results(
+    text: str,
+    analyze_chunk: Callable[[str], Any],
+    max_workers: int = 4
+) -> Iterator[Tuple[int, Any]]:
+    """
+    按文本块（见 split_chunks）并发分析文本，按完成顺序逐块产出分析结果
     
-    if valid_extractions:
-        sorted_extractions = sorted(valid_extractions, key=lambda x: x["位置"]["开始"])
-        last_pos = 0
-        
-        for i, extraction in enumerate(sorted_extractions):
-            start = extraction["位置"]["开始"]
-            end = extraction["位置"]["结束"]
-            
-            # 添加未标记的文本
-            if start > last_pos:
-                html_parts.append(text[last_pos:start])
-            
-            # 添加标记的文本
-            extraction_type = extraction["类型"]
-            colors = color_map.get(extraction_type, {"bg": "#e9ecef", "border": "#adb5bd", "label": extraction_type})
-            
-            # 构建 tooltip
-            attrs = extraction['属性']
-            tooltip_parts = [f"{extraction_type}"]
-            if 'role' in attrs:
-                tooltip_parts.append(f"语法功能: {attrs['role']}")
-            if 'meaning' in attrs:
-                tooltip_parts.append(f"含义: {attrs['meaning']}")
-            if 'type' in attrs and attrs['type'] != extraction_type:
-                tooltip_parts.append(f"类型: {attrs['type']}")
-            tooltip = " | ".join(tooltip_parts)
-            
-            html_parts.append(
-                f'<span class="highlight" id="ext-{i}" '
-                f'style="background: {colors["bg"]}; border: 2px solid {colors["border"]};" '
-                f'title="{tooltip}" '
-                f'onclick="scrollToDetail({i})">'
-                f'{text[start:end]}'
-                f'</span>'
-            )
-            
-            last_pos = end
+    Args:
+        text: 原始文本
+        analyze_chunk: 分析单个文本块的函数
+        max_workers: 最大并发数
         
-        # 添加剩余文本
-        if last_pos < len(text):
-            html_parts.append(text[last_pos:])
-    else:
-        html_parts.append(text)
+    Yields:
+        (文本块在原文中的偏移量, 该文本块的分析结果)
+    """
+    chunks = split_chunks(text)
+    if not chunks:
+        return
     
-    html_parts.append('</div>')
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+        futures = {
+            executor.submit(analyze_chunk, chunk): offset
+            for offset, chunk in chunks
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+
+def iter_chunk_extractions(
+    text: str,
+    analyze_chunk: Callable[[str], List[Dict[str, Any]]],
+    max_workers: int = 4
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    按文本块并发分析文本，按完成顺序逐块产出提取结果
     
-    # 详细信息
-    if valid_extractions:
-        html_parts.append('<div class="details">')
-        html_parts.append('<h2>详细分析</h2>')
-        
-        for i, extraction in enumerate(sorted_extractions):
-            extraction_type = extraction["类型"]
-            colors = color_map.get(extraction_type, {"bg": "#e9ecef", "border": "#adb5bd"})
-            
-            html_parts.append(
-                f'<div class="extraction-card" id="detail-{i}" style="border-color: {colors["border"]};">'
-                f'<div class="extraction-header">#{i+1} {extraction["类型"]}</div>'
-                f'<div class="extraction-text">{extraction["文本"]}</div>'
-            )
-            
-            # 属性
-            if extraction["属性"]:
-                for key, value in extraction["属性"].items():
-                    html_parts.append(
-                        f'<div class="attribute">'
-                        f'<span class="attribute-key">{key}:</span> '
-                        f'<span class="attribute-value">{value}</span>'
-                        f'</div>'
-                    )
-            
-            html_parts.append('</div>')
+    Args:
+        text: 原始文本
+        analyze_chunk: 分析单个文本块并返回格式化提取结果的函数
+        max_workers: 最大并发数
         
-        html_parts.append('</div>')
-    
-    # JavaScript
-    html_parts.extend([
-        "<script>",
-        "function scrollToDetail(index) {",
-        "  const element = document.getElementById('detail-' + index);",
-        "  if (element) {",
-        "    element.scrollIntoView({ behavior: 'smooth', block: 'center' });",
-        "    element.style.background = '#fff3cd';",
-        "    setTimeout(() => { element.style.background = '#f8f9fa'; }, 1000);",
-        "  }",
-        "}",
-        "</script>",
-        "</div>",
-        "</body>",
-        "</html>"
-    ])
-    
-    return '\n'.join(html_parts)
+    Yields:
+        单个文本块的提取结果（位置已换算为原文中的位置）
+    """
+    for offset, extractions in iter_chunk_results(text, analyze_chunk, max_workers):
+        # 没有位置信息（None）的提取保持原样
+        yield [
+            {
+                **e,
+                "位置": {
+                    "开始": None if (start := e["位置"]["开始"]) is None else start + offset,
+                    "结束": None if (end := e["位置"]["结束"]) is None else end + offset
+                }
+            }
+            for e in extractions
+        ]
 
 
-def create_colored_text(
+# 各分组依据对应的取键函数，未知的分组依据全部归入“全部”
+_KEY_FN = {
+    "类型": lambda x: x["类型"],
+    "难度": lambda x: x["属性"].get("level", "未知"),
+}
+
+
+def format_result_for_display(
     extractions: List[Dict[str, Any]],
     group_by: str = "类型"
 ) -> Dict[str, List[Dict[str, Any]]]:
@@ -473,21 +886,188 @@ def create_colored_text(
     Returns:
         分组后的结果
     """
-    grouped = {}
+    key_fn = _KEY_FN.get(group_by, lambda x: "全部")
+    grouped = defaultdict(list)
     
     for extraction in extractions:
-        if group_by == "类型":
-            key = extraction["类型"]
-        elif group_by == "难度":
-            key = extraction["属性"].get("level", "未知")
-        else:
-            key = "全部"
-        
-        if key not in grouped:
-            grouped[key] = []
-        grouped[key].append(extraction)
+        grouped[key_fn(extraction)].append(extraction)
+    
+    return dict(grouped)
+
+
+# HTML 可视化的颜色映射
+_HTML_COLOR_MAP = {
+    "subject": {"bg": "#FFE5E5", "border": "#FF6B6B", "label": "主语"},
+    "verb": {"bg": "#E5F9F9", "border": "#4ECDC4", "label": "谓语"},
+    "object": {"bg": "#E5F0FF", "border": "#45B7D1", "label": "宾语"},
+    "direct_object": {"bg": "#E5F0FF", "border": "#45B7D1", "label": "直接宾语"},
+    "indirect_object": {"bg": "#E8F5E9", "border": "#95D5B2", "label": "间接宾语"},
+    "adverbial": {"bg": "#FFF3E0", "border": "#FFA07A", "label": "状语"},
+    "phrasal_verb": {"bg": "#E8F5E9", "border": "#98D8C8", "label": "短语动词"},
+    "key_word": {"bg": "#FFF9E6", "border": "#F7DC6F", "label": "重点词汇"},
+    "idiom": {"bg": "#FFEEE5", "border": "#DDA15E", "label": "习语"},
+    "attributive": {"bg": "#F5E6D3", "border": "#BC6C25", "label": "定语"},
+    "complement": {"bg": "#E0F7FA", "border": "#A8DADC", "label": "补语"},
+}
+_HTML_DEFAULT_COLORS = {"bg": "#e9ecef", "border": "#adb5bd"}
+
+# 预先生成每种类型的高亮样式和边框颜色，避免在循环中重复查表和格式化
+_HTML_HIGHLIGHT_STYLES = {
+    k: f'background: {v["bg"]}; border: 2px solid {v["border"]};'
+    for k, v in _HTML_COLOR_MAP.items()
+}
+_HTML_DEFAULT_HIGHLIGHT_STYLE = (
+    f'background: {_HTML_DEFAULT_COLORS["bg"]}; border: 2px solid {_HTML_DEFAULT_COLORS["border"]};'
+)
+_HTML_LEGEND_ITEMS = {
+    k: (
+        f'<div class="legend-item">'
+        f'<div class="legend-box" style="background: {v["bg"]}; border-color: {v["border"]};"></div>'
+        f'<span>{v["label"]} ({k})</span>'
+        f'</div>'
+    )
+    for k, v in _HTML_COLOR_MAP.items()
+}
+
+# Streamlit 彩色文本的默认颜色映射及预生成的样式
+_COLORED_TEXT_COLOR_MAP = {
+    "subject": "#FF6B6B",
+    "verb": "#4ECDC4",
+    "object": "#45B7D1",
+    "direct_object": "#45B7D1",
+    "indirect_object": "#95D5B2",
+    "adverbial": "#FFA07A",
+    "phrasal_verb": "#98D8C8",
+    "key_word": "#F7DC6F",
+    "idiom": "#DDA15E",
+    "attributive": "#BC6C25",
+    "complement": "#A8DADC",
+}
+_COLORED_TEXT_DEFAULT_COLOR = "#CCCCCC"
+
+
+def _colored_text_span_open(color: str) -> str:
+    return (
+        f'<span class="tooltip-wrapper" style="background-color: {color}; '
+        f'padding: 2px 4px; border-radius: 3px;">'
+    )
+
+
+_COLORED_TEXT_SPAN_OPEN = {
+    k: _colored_text_span_open(v) for k, v in _COLORED_TEXT_COLOR_MAP.items()
+}
+_TOOLTIP_DIVIDER = "<hr style='margin: 5px 0; border: 0; border-top: 1px solid rgba(255,255,255,0.3);'>"
+
+# 文本和属性值写入 HTML 前的转义表（同时适用于元素内容和属性值）
+_HTML_ESCAPE = str.maketrans({
+    "&": "&amp;",
+    "<": "&lt;",
+    ">": "&gt;",
+    '"': "&quot;",
+    "'": "&#x27;",
+})
+
+
+# HTML 可视化的静态头部（样式表），只有标题需要在调用时填入
+_STATIC_HEAD_TEMPLATE = "\n".join([
+    "<!DOCTYPE html>",
+    "<html>",
+    "<head>",
+    '<meta charset="UTF-8">',
+    "<title>{title}</title>",
+    "<style>",
+    "body {{ font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif; padding: 20px; background: #f8f9fa; }}",
+    ".container {{ max-width: 1200px; margin: 0 auto; background: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }}",
+    "h1 {{ color: #2c3e50; margin-bottom: 10px; }}",
+    ".subtitle {{ color: #7f8c8d; margin-bottom: 30px; }}",
+    ".text-container {{ background: #f8f9fa; padding: 20px; border-radius: 8px; line-height: 2; font-size: 16px; margin-bottom: 30px; }}",
+    ".highlight {{ padding: 3px 6px; margin: 0 2px; border-radius: 4px; cursor: help; display: inline-block; transition: transform 0.2s; }}",
+    ".highlight:hover {{ transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.15); }}",
+    ".legend {{ display: flex; flex-wrap: wrap; gap: 15px; margin-bottom: 30px; }}",
+    ".legend-item {{ display: flex; align-items: center; gap: 8px; padding: 8px 15px; border-radius: 6px; background: #f8f9fa; }}",
+    ".legend-box {{ width: 20px; height: 20px; border-radius: 4px; border: 2px solid; }}",
+    ".details {{ margin-top: 30px; }}",
+    ".extraction-card {{ background: #f8f9fa; padding: 20px; margin-bottom: 15px; border-radius: 8px; border-left: 4px solid; }}",
+    ".extraction-header {{ font-weight: bold; font-size: 18px; margin-bottom: 10px; }}",
+    ".extraction-text {{ background: white; padding: 10px 15px; border-radius: 6px; font-family: monospace; margin: 10px 0; }}",
+    ".attribute {{ display: inline-block; margin-right: 15px; margin-top: 5px; }}",
+    ".attribute-key {{ font-weight: bold; color: #7f8c8d; }}",
+    ".attribute-value {{ color: #2c3e50; }}",
+    "</style>",
+    "</head>",
+    "<body>",
+    '<div class="container">',
+    '<h1>{title}</h1>',
+    '<p class="subtitle">点击或悬停查看详细信息</p>',
+])
+
+# HTML 可视化的尾部脚本
+_FOOTER_SCRIPT = "\n" + "\n".join([
+    "<script>",
+    "function scrollToDetail(index) {",
+    "  const element = document.getElementById('detail-' + index);",
+    "  if (element) {",
+    "    element.scrollIntoView({ behavior: 'smooth', block: 'center' });",
+    "    element.style.background = '#fff3cd';",
+    "    setTimeout(() => { element.style.background = '#f8f9fa'; }, 1000);",
+    "  }",
+    "}",
+    "</script>",
+    "</div>",
+    "</body>",
+    "</html>"
+])
+
+
+class _Span(NamedTuple):
+    """渲染用的紧凑提取记录（位置已校验）"""
+    start: int
+    end: int
+    type: str
+    text: str
+    attrs: Dict[str, Any]
+
+
+# 提取数超过该值且安装了 numpy 时，改用向量化方式筛选和排序
+_NUMPY_FILTER_MIN = 256
+
+
+def _collect_spans(text: str, extractions: List[Dict[str, Any]]) -> List[_Span]:
+    """筛选位置落在文本范围内的提取，转换为 _Span 并按开始位置排序"""
+    text_len = len(text)
     
-    return grouped
+    if np is not None and len(extractions) > _NUMPY_FILTER_MIN:
+        positions = [e["位置"] for e in extractions]
+        starts = np.array(
+            [-1 if (p := pos["开始"]) is None else p for pos in positions], dtype=np.int64
+        )
+        ends = np.array(
+            [-1 if (p := pos["结束"]) is None else p for pos in positions], dtype=np.int64
+        )
+        mask = (starts >= 0) & (ends > starts) & (ends <= text_len)
+        valid_idx = np.nonzero(mask)[0]
+        order = valid_idx[np.argsort(starts[valid_idx], kind="stable")]
+        spans = []
+        for i in order.tolist():
+            e = extractions[i]
+            spans.append(_Span(positions[i]["开始"], positions[i]["结束"], e["类型"], e["文本"], e["属性"]))
+        return spans
+    
+    spans = [
+        _Span(start, end, e["类型"], e["文本"], e["属性"])
+        for e in extractions
+        if (start := e["位置"]["开始"]) is not None
+        and (end := e["位置"]["结束"]) is not None
+        and 0 <= start < end <= text_len
+    ]
+    spans.sort(key=itemgetter(0))
+    return spans
+
+
+# 最近生成的 HTML 可视化，按输入内容缓存，界面刷新重复渲染时直接复用
+_HTML_RENDER_CACHE: "OrderedDict[Tuple[str, bytes, str], str]" = OrderedDict()
+_HTML_RENDER_CACHE_SIZE = 32
+_html_render_lock = threading.Lock()
 
 
 def create_simple_html_visualization(
@@ -506,97 +1086,72 @@ def create_simple_html_visualization(
     Returns:
         HTML 字符串
     """
-    # 颜色映射
-    color_map = {
-        "subject": {"bg": "#FFE5E5", "border": "#FF6B6B", "label": "主语"},
-        "verb": {"bg": "#E5F9F9", "border": "#4ECDC4", "label": "谓语"},
-        "object": {"bg": "#E5F0FF", "border": "#45B7D1", "label": "宾语"},
-        "direct_object": {"bg": "#E5F0FF", "border": "#45B7D1", "label": "直接宾语"},
-        "indirect_object": {"bg": "#E8F5E9", "border": "#95D5B2", "label": "间接宾语"},
-        "adverbial": {"bg": "#FFF3E0", "border": "#FFA07A", "label": "状语"},
-        "phrasal_verb": {"bg": "#E8F5E9", "border": "#98D8C8", "label": "短语动词"},
-        "key_word": {"bg": "#FFF9E6", "border": "#F7DC6F", "label": "重点词汇"},
-        "idiom": {"bg": "#FFEEE5", "border": "#DDA15E", "label": "习语"},
-        "attributive": {"bg": "#F5E6D3", "border": "#BC6C25", "label": "定语"},
-        "complement": {"bg": "#E0F7FA", "border": "#A8DADC", "label": "补语"},
-    }
+    try:
+        key = (text, hashlib.sha1(_dumps_jsonl(extractions)).digest(), title)
+    except (TypeError, ValueError):
+        # 提取结果无法序列化（如非字符串的属性键）时不缓存，直接渲染
+        return _render_simple_html(text, extractions, title)
     
-    # 构建 HTML
-    html_parts = [
-        "<!DOCTYPE html>",
-        "<html>",
-        "<head>",
-        '<meta charset="UTF-8">',
-        f"<title>{title}</title>",
-        "<style>",
-        "body { font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Arial, sans-serif; padding: 20px; background: #f8f9fa; }",
-        ".container { max-width: 1200px; margin: 0 auto; background: white; padding: 30px; border-radius: 10px; box-shadow: 0 2px 10px rgba(0,0,0,0.1); }",
-        "h1 { color: #2c3e50; margin-bottom: 10px; }",
-        ".subtitle { color: #7f8c8d; margin-bottom: 30px; }",
-        ".text-container { background: #f8f9fa; padding: 20px; border-radius: 8px; line-height: 2; font-size: 16px; margin-bottom: 30px; }",
-        ".highlight { padding: 3px 6px; margin: 0 2px; border-radius: 4px; cursor: help; display: inline-block; transition: transform 0.2s; }",
-        ".highlight:hover { transform: translateY(-2px); box-shadow: 0 4px 8px rgba(0,0,0,0.15); }",
-        ".legend { display: flex; flex-wrap: wrap; gap: 15px; margin-bottom: 30px; }",
-        ".legend-item { display: flex; align-items: center; gap: 8px; padding: 8px 15px; border-radius: 6px; background: #f8f9fa; }",
-        ".legend-box { width: 20px; height: 20px; border-radius: 4px; border: 2px solid; }",
-        ".details { margin-top: 30px; }",
-        ".extraction-card { background: #f8f9fa; padding: 20px; margin-bottom: 15px; border-radius: 8px; border-left: 4px solid; }",
-        ".extraction-header { font-weight: bold; font-size: 18px; margin-bottom: 10px; }",
-        ".extraction-text { background: white; padding: 10px 15px; border-radius: 6px; font-family: monospace; margin: 10px 0; }",
-        ".attribute { display: inline-block; margin-right: 15px; margin-top: 5px; }",
-        ".attribute-key { font-weight: bold; color: #7f8c8d; }",
-        ".attribute-value { color: #2c3e50; }",
-        "</style>",
-        "</head>",
-        "<body>",
-        '<div class="container">',
-        f'<h1>{title}</h1>',
-        '<p class="subtitle">点击或悬停查看详细信息</p>',
-    ]
+    with _html_render_lock:
+        cached = _HTML_RENDER_CACHE.get(key)
+        if cached is not None:
+            _HTML_RENDER_CACHE.move_to_end(key)
+            return cached
+    
+    html_content = _render_simple_html(text, extractions, title)
+    
+    with _html_render_lock:
+        _HTML_RENDER_CACHE[key] = html_content
+        if len(_HTML_RENDER_CACHE) > _HTML_RENDER_CACHE_SIZE:
+            _HTML_RENDER_CACHE.popitem(last=False)
+    
+    return html_content
+
+
+def _render_simple_html(
+    text: str,
+    extractions: List[Dict[str, Any]],
+    title: str
+) -> str:
+    """生成 create_simple_html_visualization 的 HTML（不经过缓存）"""
+    # 构建 HTML（各部分之间以换行分隔）
+    buf = io.StringIO()
+    w = buf.write
+    w(_STATIC_HEAD_TEMPLATE.format(title=html.escape(title)))
     
     # 图例
     used_types = set(e["类型"] for e in extractions)
     if used_types:
-        html_parts.append('<div class="legend">')
-        for extraction_type in used_types:
-            if extraction_type in color_map:
-                colors = color_map[extraction_type]
-                html_parts.append(
-                    f'<div class="legend-item">'
-                    f'<div class="legend-box" style="background: {colors["bg"]}; border-color: {colors["border"]};"></div>'
-                    f'<span>{colors["label"]} ({extraction_type})</span>'
-                    f'</div>'
-                )
-        html_parts.append('</div>')
+        w('\n<div class="legend">')
+        for t in used_types:
+            if t in _HTML_LEGEND_ITEMS:
+                w("\n")
+                w(_HTML_LEGEND_ITEMS[t])
+        w('\n</div>')
     
     # 带标注的文本
-    html_parts.append('<div class="text-container">')
+    w('\n<div class="text-container">')
     
-    # 过滤有效的提取
-    valid_extractions = [
-        e for e in extractions
-        if e["位置"]["开始"] is not None and e["位置"]["结束"] is not None
-        and 0 <= e["位置"]["开始"] < e["位置"]["结束"] <= len(text)
-    ]
+    # 有效的提取（紧凑元组记录，两轮遍历都直接解包）
+    items = _collect_spans(text, extractions)
+    
+    esc = _HTML_ESCAPE
     
-    if valid_extractions:
-        sorted_extractions = sorted(valid_extractions, key=lambda x: x["位置"]["开始"])
+    if items:
         last_pos = 0
+        highlight_styles = _HTML_HIGHLIGHT_STYLES
+        default_style = _HTML_DEFAULT_HIGHLIGHT_STYLE
         
-        for i, extraction in enumerate(sorted_extractions):
-            start = extraction["位置"]["开始"]
-            end = extraction["位置"]["结束"]
-            
+        for i, (start, end, extraction_type, _, attrs) in enumerate(items):
             # 添加未标记的文本
             if start > last_pos:
-                html_parts.append(text[last_pos:start])
+                w("\n")
+                w(text[last_pos:start].translate(esc))
             
             # 添加标记的文本
-            extraction_type = extraction["类型"]
-            colors = color_map.get(extraction_type, {"bg": "#e9ecef", "border": "#adb5bd", "label": extraction_type})
+            style = highlight_styles.get(extraction_type, default_style)
             
             # 构建 tooltip
-            attrs = extraction['属性']
             tooltip_parts = [f"{extraction_type}"]
             if 'role' in attrs:
                 tooltip_parts.append(f"语法功能: {attrs['role']}")
@@ -604,74 +1159,58 @@ def create_simple_html_visualization(
                 tooltip_parts.append(f"含义: {attrs['meaning']}")
             if 'type' in attrs and attrs['type'] != extraction_type:
                 tooltip_parts.append(f"类型: {attrs['type']}")
-            tooltip = " | ".join(tooltip_parts)
+            tooltip = " | ".join(tooltip_parts).translate(esc)
             
-            html_parts.append(
-                f'<span class="highlight" id="ext-{i}" '
-                f'style="background: {colors["bg"]}; border: 2px solid {colors["border"]};" '
-                f'title="{tooltip}" '
-                f'onclick="scrollToDetail({i})">'
-                f'{text[start:end]}'
-                f'</span>'
+            # 高亮内部不能插入换行，否则会多出空白
+            w(
+                f'\n<span class="highlight" id="ext-{i}" style="{style}" '
+                f'title="{tooltip}" onclick="scrollToDetail({i})">'
+                f'{text[start:end].translate(esc)}</span>'
             )
             
             last_pos = end
         
         # 添加剩余文本
         if last_pos < len(text):
-            html_parts.append(text[last_pos:])
+            w("\n")
+            w(text[last_pos:].translate(esc))
     else:
-        html_parts.append(text)
+        w("\n")
+        w(text.translate(esc))
     
-    html_parts.append('</div>')
+    w('\n</div>')
     
     # 详细信息
-    if valid_extractions:
-        html_parts.append('<div class="details">')
-        html_parts.append('<h2>详细分析</h2>')
+    if items:
+        w('\n<div class="details">\n<h2>详细分析</h2>')
         
-        for i, extraction in enumerate(sorted_extractions):
-            extraction_type = extraction["类型"]
-            colors = color_map.get(extraction_type, {"bg": "#e9ecef", "border": "#adb5bd"})
+        for i, (_, _, extraction_type, extraction_text, attrs) in enumerate(items):
+            border = _HTML_COLOR_MAP.get(extraction_type, _HTML_DEFAULT_COLORS)["border"]
             
-            html_parts.append(
-                f'<div class="extraction-card" id="detail-{i}" style="border-color: {colors["border"]};">'
-                f'<div class="extraction-header">#{i+1} {extraction["类型"]}</div>'
-                f'<div class="extraction-text">{extraction["文本"]}</div>'
+            w(
+                f'\n<div class="extraction-card" id="detail-{i}" style="border-color: {border};">'
+                f'<div class="extraction-header">#{i+1} {extraction_type.translate(esc)}</div>'
+                f'<div class="extraction-text">{extraction_text.translate(esc)}</div>'
             )
             
             # 属性
-            if extraction["属性"]:
-                for key, value in extraction["属性"].items():
-                    html_parts.append(
-                        f'<div class="attribute">'
-                        f'<span class="attribute-key">{key}:</span> '
-                        f'<span class="attribute-value">{value}</span>'
+            if attrs:
+                for key, value in attrs.items():
+                    w(
+                        f'\n<div class="attribute">'
+                        f'<span class="attribute-key">{str(key).translate(esc)}:</span> '
+                        f'<span class="attribute-value">{str(value).translate(esc)}</span>'
                         f'</div>'
                     )
             
-            html_parts.append('</div>')
+            w('\n</div>')
         
-        html_parts.append('</div>')
+        w('\n</div>')
     
     # JavaScript
-    html_parts.extend([
-        "<script>",
-        "function scrollToDetail(index) {",
-        "  const element = document.getElementById('detail-' + index);",
-        "  if (element) {",
-        "    element.scrollIntoView({ behavior: 'smooth', block: 'center' });",
-        "    element.style.background = '#fff3cd';",
-        "    setTimeout(() => { element.style.background = '#f8f9fa'; }, 1000);",
-        "  }",
-        "}",
-        "</script>",
-        "</div>",
-        "</body>",
-        "</html>"
-    ])
-    
-    return '\n'.join(html_parts)
+    w(_FOOTER_SCRIPT)
+    
+    return buf.getvalue()
 
 
 def create_colored_text(
@@ -691,78 +1230,57 @@ def create_colored_text(
         HTML 格式的彩色文本
     """
     if color_map is None:
-        color_map = {
-            "subject": "#FF6B6B",
-            "verb": "#4ECDC4",
-            "object": "#45B7D1",
-            "direct_object": "#45B7D1",
-            "indirect_object": "#95D5B2",
-            "adverbial": "#FFA07A",
-            "phrasal_verb": "#98D8C8",
-            "key_word": "#F7DC6F",
-            "idiom": "#DDA15E",
-            "attributive": "#BC6C25",
-            "complement": "#A8DADC",
-        }
+        span_open = _COLORED_TEXT_SPAN_OPEN
+    else:
+        span_open = {k: _colored_text_span_open(v) for k, v in color_map.items()}
+    default_span_open = _colored_text_span_open(_COLORED_TEXT_DEFAULT_COLOR)
     
-    # 过滤掉没有有效位置信息的提取
-    valid_extractions = [
-        e for e in extractions 
-        if e["位置"]["开始"] is not None and e["位置"]["结束"] is not None
-        and e["位置"]["开始"] >= 0 and e["位置"]["结束"] > e["位置"]["开始"]
-    ]
+    # 过滤掉没有有效位置信息的提取并按位置排序
+    items = _collect_spans(text, extractions)
     
     # 如果没有有效的位置信息，返回原文
-    if not valid_extractions:
-        return text
+    if not items:
+        return text.translate(_HTML_ESCAPE)
     
-    # 按位置排序
-    sorted_extractions = sorted(
-        valid_extractions,
-        key=lambda x: x["位置"]["开始"]
-    )
+    # 合并重叠区间，每个区间只输出一个高亮，tooltip 中列出区间内的全部提取
+    merged = merge_intervals(items)
     
     # 构建 HTML
-    html_parts = []
+    buf = io.StringIO()
+    w = buf.write
+    esc = _HTML_ESCAPE
     last_pos = 0
     
-    for extraction in sorted_extractions:
-        start = extraction["位置"]["开始"]
-        end = extraction["位置"]["结束"]
-        
-        # 跳过无效范围
-        if start >= len(text) or end > len(text) or start >= end:
-            continue
-        
+    for start, end, group in merged:
         # 添加未标记的文本
         if start > last_pos:
-            html_parts.append(text[last_pos:start])
-        
-        # 添加标记的文本
-        color = color_map.get(extraction["类型"], "#CCCCCC")
+            w(text[last_pos:start].translate(esc))
         
         # 构建丰富的 tooltip 内容
-        tooltip_lines = [f"<strong>{extraction['类型']}</strong>"]
-        if extraction['属性']:
-            tooltip_lines.append("<hr style='margin: 5px 0; border: 0; border-top: 1px solid rgba(255,255,255,0.3);'>")
-            for k, v in extraction['属性'].items():
-                tooltip_lines.append(f"<div><span style='opacity:0.8'>{k}:</span> {v}</div>")
-        
-        tooltip_html = "".join(tooltip_lines)
-        
-        html_parts.append(
-            f'<span class="tooltip-wrapper" style="background-color: {color}; '
-            f'padding: 2px 4px; border-radius: 3px;">'
-            f'{text[start:end]}'
-            f'<span class="tooltip-text">{tooltip_html}</span>'
-            f'</span>'
-        )
+        tooltip_lines = []
+        for span in group:
+            if tooltip_lines:
+                tooltip_lines.append(_TOOLTIP_DIVIDER)
+            tooltip_lines.append(f"<strong>{span.type.translate(esc)}</strong>")
+            if span.attrs:
+                tooltip_lines.append(_TOOLTIP_DIVIDER)
+                tooltip_lines.extend(
+                    f"<div><span style='opacity:0.8'>{str(k).translate(esc)}:</span> {str(v).translate(esc)}</div>"
+                    for k, v in span.attrs.items()
+                )
+        
+        # 添加标记的文本，颜色取区间内第一个提取的类型
+        w(span_open.get(group[0].type, default_span_open))
+        w(text[start:end].translate(esc))
+        w('<span class="tooltip-text">')
+        w("".join(tooltip_lines))
+        w('</span></span>')
         
-        last_pos = max(last_pos, end)  # 避免重叠
+        last_pos = end
     
     # 添加剩余文本
     if last_pos < len(text):
-        html_parts.append(text[last_pos:])
+        w(text[last_pos:].translate(esc))
     
-    return ''.join(html_parts)
+    return buf.getvalue()
 
@@ -0,0 +1,262 @@
+"""
+语义缓存模块
+对仅在空白、大小写、标点或轻微改写上不同的输入复用已有分析结果，避免重复调用 LLM
+"""
+
+import os
+import re
+import time
+import zlib
+import pickle
+import sqlite3
+import hashlib
+import threading
+import importlib.util
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Tuple
+
+# numpy 为可选依赖（sentence-transformers 也依赖它）；未安装时仅按规范化文本精确匹配
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+DEFAULT_PATH = os.path.join(".cache", "semantic.sqlite3")
+MODEL_NAME = "all-MiniLM-L6-v2"
+
+# 条目的过期时间（秒），从写入时开始计算
+DEFAULT_TTL = 7 * 24 * 3600
+
+# 最多保留的条目数，超出后淘汰最早写入的条目
+MAX_ENTRIES = 5000
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：去除首尾空白、合并连续空白并转为小写"""
+    return re.sub(r"\s+", " ", text.strip().lower())
+
+
+def _text_key(text: str) -> bytes:
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).digest()
+
+
+@lru_cache(maxsize=1)
+def is_available() -> bool:
+    """是否可以做向量相似度匹配（只检查是否安装，不导入 sentence-transformers）"""
+    return np is not None and importlib.util.find_spec("sentence_transformers") is not None
+
+
+@lru_cache(maxsize=1)
+def _get_model():
+    """首次使用时才导入 sentence-transformers（依赖 torch，导入很慢）并加载模型"""
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(MODEL_NAME)
+
+
+def embed(text: str):
+    """计算规范化文本的归一化向量，未安装 sentence-transformers 时返回 None"""
+    if not is_available():
+        return None
+    embedding = _get_model().encode(normalize_text(text), normalize_embeddings=True)
+    return np.asarray(embedding, dtype=np.float32)
+
+
+class SemanticCache:
+    """基于 SQLite 的语义缓存：先按规范化文本精确匹配，再按向量相似度匹配"""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_PATH,
+        ttl: int = DEFAULT_TTL,
+        max_entries: int = MAX_ENTRIES
+    ):
+        """
+        初始化缓存
+
+        Args:
+            path: SQLite 数据库文件路径
+            ttl: 过期时间（秒），从写入时开始计算
+            max_entries: 最大条目数，超出后淘汰最早写入的条目
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        # 上下文 -> (缓存键列表, 向量矩阵)，按需从数据库加载
+        self._indexes: Dict[bytes, Tuple[List[bytes], Any]] = {}
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS semantic ("
+            "context BLOB, key BLOB, value BLOB, vector BLOB, created INTEGER, "
+            "PRIMARY KEY (context, key))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS semantic_created ON semantic (created)")
+        self._conn.commit()
+
+    def _get(self, context: bytes, key: bytes) -> Optional[Any]:
+        """读取单个条目（调用方需持有锁），过期的条目直接删除"""
+        row = self._conn.execute(
+            "SELECT value, created FROM semantic WHERE context = ? AND key = ?", (context, key)
+        ).fetchone()
+        if row is None:
+            return None
+
+        value, created = row
+        if time.time() - created > self.ttl:
+            self._conn.execute("DELETE FROM semantic WHERE context = ? AND key = ?", (context, key))
+            self._conn.commit()
+            self._indexes.pop(context, None)
+            return None
+
+        try:
+            return pickle.loads(zlib.decompress(value))
+        except Exception:
+            return None
+
+    def _index(self, context: bytes) -> Tuple[List[bytes], Any]:
+        """按上下文懒加载未过期条目的向量索引（调用方需持有锁）"""
+        index = self._indexes.get(context)
+        if index is None:
+            rows = self._conn.execute(
+                "SELECT key, vector FROM semantic "
+                "WHERE context = ? AND vector IS NOT NULL AND created >= ?",
+                (context, int(time.time()) - self.ttl)
+            ).fetchall()
+            keys = [key for key, _ in rows]
+            matrix = (
+                np.stack([np.frombuffer(vector, dtype=np.float32) for _, vector in rows])
+                if rows else None
+            )
+            index = self._indexes[context] = (keys, matrix)
+        return index
+
+    def lookup(
+        self,
+        text: str,
+        context: bytes,
+        threshold: float = 0.97,
+        embedding=None
+    ) -> Optional[Any]:
+        """
+        查找相同或语义相近输入的缓存结果
+
+        Args:
+            text: 要分析的文本
+            context: 分析上下文（模型、提示词和示例的摘要），不同上下文的结果互不复用
+            threshold: 余弦相似度阈值
+            embedding: 预先计算好的 embed(text)，为 None 时按需计算
+
+        Returns:
+            命中时返回缓存的结果（位置仍是缓存时原文中的位置），未命中返回 None
+        """
+        with self._lock:
+            value = self._get(context, _text_key(text))
+        if value is not None:
+            return value
+
+        # 模型推理较慢，不在锁内进行
+        if embedding is None:
+            embedding = embed(text)
+        if embedding is None:
+            return None
+
+        with self._lock:
+            keys, matrix = self._index(context)
+            if matrix is None:
+                return None
+            scores = matrix @ embedding
+            candidates = [keys[i] for i in np.argsort(-scores) if scores[i] >= threshold]
+
+        # 依次尝试达到阈值的条目，跳过期间已过期或被淘汰的
+        for key in candidates:
+            with self._lock:
+                value = self._get(context, key)
+            if value is not None:
+                return value
+        return None
+
+    def store(
+        self,
+        text: str,
+        context: bytes,
+        value: Any,
+        embedding=None
+    ) -> None:
+        """
+        保存分析结果
+
+        Args:
+            text: 分析的文本
+            context: 分析上下文（模型、提示词和示例的摘要）
+            value: 分析结果（可 pickle 的对象）
+            embedding: 预先计算好的 embed(text)，为 None 时按需计算
+        """
+        key = _text_key(text)
+        if embedding is None:
+            embedding = embed(text)
+        vector = embedding.tobytes() if embedding is not None else None
+        blob = zlib.compress(pickle.dumps(value))
+        now = int(time.time())
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO semantic (context, key, value, vector, created) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (context, key, blob, vector, now)
+            )
+
+            # 清理过期条目，并在超出容量时淘汰最早写入的条目
+            removed = self._conn.execute(
+                "DELETE FROM semantic WHERE created < ?", (now - self.ttl,)
+            ).rowcount
+            overflow = self._conn.execute("SELECT COUNT(*) FROM semantic").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                removed += self._conn.execute(
+                    "DELETE FROM semantic WHERE rowid IN "
+                    "(SELECT rowid FROM semantic ORDER BY created LIMIT ?)",
+                    (overflow,)
+                ).rowcount
+            self._conn.commit()
+
+            if removed:
+                self._indexes.clear()
+            elif context in self._indexes and embedding is not None:
+                keys, matrix = self._indexes[context]
+                if key not in keys:
+                    keys.append(key)
+                    matrix = embedding[np.newaxis, :] if matrix is None else np.vstack([matrix, embedding])
+                    self._indexes[context] = (keys, matrix)
+
+
+_default_cache: Optional[SemanticCache] = None
+_default_lock = threading.Lock()
+
+
+def _get_default_cache() -> SemanticCache:
+    global _default_cache
+    with _default_lock:
+        if _default_cache is None:
+            _default_cache = SemanticCache()
+        return _default_cache
+
+
+def lookup(
+    text: str,
+    context: bytes,
+    threshold: float = 0.97
+) -> Optional[Any]:
+    """在默认缓存中查找，见 SemanticCache.lookup"""
+    return _get_default_cache().lookup(text, context, threshold)
+
+
+def store(
+    text: str,
+    context: bytes,
+    value: Any
+) -> None:
+    """保存到默认缓存，见 SemanticCache.store"""
+    _get_default_cache().store(text, context, value)